@@ -1,23 +1,178 @@
-from flask import Flask, request, jsonify, send_file
+from flask import Flask, Response, request, jsonify, stream_with_context
 from flask_cors import CORS
-from utils import fetch_news, generate_comparative_tts
-import os
+from utils import (fetch_news, fetch_news_batch, iter_news, generate_comparative_tts_audio, cleanup_tts_files,
+                   submit_news_job, submit_tts_job, get_job, JobQueueFull, warm_up, get_startup_report,
+                   collect_timings, render_metrics, sentiment_history, topic_history, analysis_history,
+                   history_range, NEWS_BATCH_MAX_COMPANIES, HISTORY_BUCKETS)
+from werkzeug.http import generate_etag
+import gzip
+import json
+
+try:
+    import brotli
+except ImportError:  # brotli is optional; responses fall back to gzip
+    brotli = None
 
 app = Flask(__name__)
-CORS(app)
+CORS(app, expose_headers=["Accept-Ranges", "Content-Range", "Content-Length", "ETag"])
+
+# Size of each chunk when streaming audio responses
+AUDIO_CHUNK_SIZE = 64 * 1024
+# Longest time a client may long-poll a job for
+MAX_JOB_WAIT = 30
+# Responses smaller than this are not worth compressing
+COMPRESS_MIN_BYTES = 1024
+COMPRESSIBLE_MIMETYPES = ("application/json", "application/x-ndjson", "text/plain")
+
+
+def select_article_fields(articles):
+    """Apply ?fields=Title,Summary,... (keep) and ?exclude=content,... (drop) to article dicts"""
+    fields = [f.strip() for f in request.args.get("fields", "").split(",") if f.strip()]
+    exclude = {f.strip() for f in request.args.get("exclude", "").split(",") if f.strip()}
+    if not fields and not exclude:
+        return articles
+    return [{key: value for key, value in article.items()
+             if (not fields or key in fields) and key not in exclude} for article in articles]
+
+
+def select_fields(news_data):
+    """Apply field selection to the articles of a formatted_output"""
+    if isinstance(news_data, dict) and "Articles" in news_data:
+        news_data["Articles"] = select_article_fields(news_data["Articles"])
+    return news_data
+
+
+@app.after_request
+def finalize_response(response):
+    """Make JSON GETs conditional on a weak ETag and compress large text responses"""
+    if response.direct_passthrough or response.is_streamed:
+        return response
+
+    if request.method == "GET" and response.status_code == 200 and response.mimetype == "application/json":
+        response.add_etag(weak=True)
+        response.make_conditional(request)
+        if response.status_code == 304:
+            return response
+
+    if (response.mimetype in COMPRESSIBLE_MIMETYPES and "Content-Encoding" not in response.headers
+            and response.content_length is not None and response.content_length >= COMPRESS_MIN_BYTES):
+        encoding = request.accept_encodings.best_match(["br", "gzip"] if brotli is not None else ["gzip"])
+        if encoding:
+            data = response.get_data()
+            response.set_data(brotli.compress(data) if encoding == "br" else gzip.compress(data, compresslevel=6))
+            response.headers["Content-Encoding"] = encoding
+        response.vary.add("Accept-Encoding")
+    return response
 
 
 @app.route("/news", methods=["GET"])
 def get_news():
-    """Fetch and analyze news articles for a given company"""
+    """Fetch and analyze news articles for a given company
+
+    With ?timings=1 the response also carries a per-stage timing breakdown;
+    ?fields= / ?exclude= select which article fields are returned.
+    """
     company = request.args.get("company")
     if not company:
         return jsonify({"error": "Company name is required"}), 400
 
     # Fetch news with the updated format
-    news_data = fetch_news(company)
+    if request.args.get("timings") == "1":
+        with collect_timings() as timings:
+            news_data = fetch_news(company)
+        news_data["Timings"] = timings
+    else:
+        news_data = fetch_news(company)
+
+    return jsonify(select_fields(news_data))
+
+
+@app.route("/news/batch", methods=["POST"])
+def get_news_batch():
+    """Fetch and analyze news for several companies in one request"""
+    data = request.get_json(silent=True) or {}
+    companies = data.get("companies")
+    if not isinstance(companies, list) or not companies or not all(isinstance(c, str) for c in companies):
+        return jsonify({"error": "A list of company names is required"}), 400
+    if len(companies) > NEWS_BATCH_MAX_COMPANIES:
+        return jsonify({"error": f"At most {NEWS_BATCH_MAX_COMPANIES} companies per batch"}), 400
 
-    return jsonify(news_data)
+    return jsonify([select_fields(news_data) for news_data in fetch_news_batch(companies)])
+
+
+@app.route("/news/stream", methods=["GET"])
+def stream_news():
+    """Stream news analysis as newline-delimited JSON events
+
+    Each article is sent as soon as it is scraped and scored (marked
+    "partial" until its summary and topics arrive); the comparative analysis
+    is always the last event.
+    """
+    company = request.args.get("company")
+    if not company:
+        return jsonify({"error": "Company name is required"}), 400
+
+    def generate():
+        for event in iter_news(company):
+            if event["event"] == "article":
+                event["article"] = select_article_fields([event["article"]])[0]
+            yield json.dumps(event) + "\n"
+
+    return Response(stream_with_context(generate()), mimetype="application/x-ndjson",
+                    headers={"X-Accel-Buffering": "no", "Cache-Control": "no-cache"})
+
+
+def history_args():
+    """Read ?bucket=, ?since= and ?until= for the history endpoints, or return an error response"""
+    bucket = request.args.get("bucket", "day")
+    if bucket not in HISTORY_BUCKETS:
+        return None, (jsonify({"error": f"bucket must be one of {', '.join(HISTORY_BUCKETS)}"}), 400)
+    since, until = request.args.get("since"), request.args.get("until")
+    try:
+        history_range(since, until)
+    except ValueError:
+        return None, (jsonify({"error": "since and until must be ISO dates or timestamps"}), 400)
+    return {"bucket": bucket, "since": since, "until": until}, None
+
+
+@app.route("/history/sentiment", methods=["GET"])
+def history_sentiment():
+    """Sentiment distribution of a company's recorded articles per time bucket"""
+    company = request.args.get("company")
+    if not company:
+        return jsonify({"error": "Company name is required"}), 400
+    args, error = history_args()
+    if error:
+        return error
+
+    return jsonify({"Company": company, "Bucket": args["bucket"], "Sentiment": sentiment_history(company, **args)})
+
+
+@app.route("/history/topics", methods=["GET"])
+def history_topics():
+    """Topic frequencies per time bucket for a company and/or a single topic"""
+    company = request.args.get("company")
+    topic = request.args.get("topic")
+    if not company and not topic:
+        return jsonify({"error": "Company name or topic is required"}), 400
+    args, error = history_args()
+    if error:
+        return error
+
+    limit = min(max(request.args.get("limit", 10, type=int), 1), 100)
+    return jsonify({"Company": company, "Topic": topic, "Bucket": args["bucket"],
+                    "Topics": topic_history(company, topic, limit=limit, **args)})
+
+
+@app.route("/history/analyses", methods=["GET"])
+def history_analyses():
+    """Recent comparative analyses stored for a company, newest first"""
+    company = request.args.get("company")
+    if not company:
+        return jsonify({"error": "Company name is required"}), 400
+
+    limit = min(max(request.args.get("limit", 20, type=int), 1), 100)
+    return jsonify({"Company": company, "Analyses": analysis_history(company, limit=limit)})
 
 
 @app.route("/tts-final", methods=["POST"])
@@ -29,22 +184,129 @@ def text_to_speech_final():
     if not analysis:
         return jsonify({"error": "Analysis data is required"}), 400
 
-    # Only generate Hindi speech for the final sentiment analysis
-    audio_file = generate_comparative_tts(analysis)
-
-    if audio_file and os.path.exists(audio_file):
-        try:
-            return send_file(
-                audio_file,
-                mimetype="audio/mpeg",
-                as_attachment=True,
-                download_name="final_analysis.mp3"
-            )
-        except Exception as e:
-            return jsonify({"error": f"Error sending audio file: {str(e)}"}), 500
+    # Only generate Hindi speech for the final sentiment analysis; audio is
+    # synthesized in memory (or taken from the TTS cache) and streamed out
+    audio = generate_comparative_tts_audio(analysis)
+
+    if audio:
+        return audio_response(audio, "final_analysis.mp3")
     else:
         return jsonify({"error": "Failed to generate speech"}), 500
 
 
+def audio_response(audio, download_name):
+    """Stream MP3 bytes in chunks, honouring a single HTTP Range request"""
+    total = len(audio)
+    status = 200
+    start, stop = 0, total
+    headers = {
+        "Accept-Ranges": "bytes",
+        "Content-Disposition": f"attachment; filename={download_name}",
+    }
+
+    if request.range is not None:
+        byte_range = request.range.range_for_length(total)
+        if byte_range is None:
+            return Response(status=416, headers={"Content-Range": f"bytes */{total}"})
+        start, stop = byte_range
+        status = 206
+        headers["Content-Range"] = request.range.to_content_range_header(total)
+
+    headers["Content-Length"] = str(stop - start)
+    view = memoryview(audio)[start:stop]
+
+    def chunks():
+        for offset in range(0, len(view), AUDIO_CHUNK_SIZE):
+            yield bytes(view[offset:offset + AUDIO_CHUNK_SIZE])
+
+    return Response(chunks(), status=status, mimetype="audio/mpeg", headers=headers)
+
+
+def job_accepted(submit, *args):
+    """Submit a background job and answer 202 with its id (503 when the queue is full)"""
+    try:
+        job_id = submit(*args)
+    except JobQueueFull as e:
+        return jsonify({"error": f"Server busy: {e}"}), 503, {"Retry-After": "5"}
+    return jsonify({"job_id": job_id, "status_url": f"/jobs/{job_id}"}), 202, {"Location": f"/jobs/{job_id}"}
+
+
+@app.route("/jobs/news", methods=["POST"])
+def submit_news():
+    """Start analyzing news for a company in the background"""
+    data = request.get_json(silent=True) or {}
+    company = data.get("company") or request.args.get("company")
+    if not company:
+        return jsonify({"error": "Company name is required"}), 400
+
+    return job_accepted(submit_news_job, company)
+
+
+@app.route("/jobs/tts-final", methods=["POST"])
+def submit_tts_final():
+    """Start generating Hindi speech for the final sentiment analysis in the background"""
+    data = request.get_json(silent=True) or {}
+    analysis = data.get("analysis", {})
+    if not analysis:
+        return jsonify({"error": "Analysis data is required"}), 400
+
+    return job_accepted(submit_tts_job, analysis)
+
+
+@app.route("/jobs/<job_id>", methods=["GET"])
+def job_status(job_id):
+    """Poll (or long-poll with ?wait=seconds) a background job
+
+    ?since=N returns only progress events after the first N; pass back the
+    "next" value from the previous response to receive each event once.
+    A finished news job carries the ETag of its result, so a client can tell
+    whether a refresh changed anything.
+    """
+    wait = min(request.args.get("wait", 0, type=float), MAX_JOB_WAIT)
+    since = max(request.args.get("since", 0, type=int), 0)
+    job = get_job(job_id, wait=wait, since=since)
+    if job is None:
+        return jsonify({"error": "Unknown or expired job"}), 404
+
+    if job["kind"] == "tts":
+        # Audio is fetched separately from /jobs/<id>/audio
+        job["result"] = {"audio_url": f"/jobs/{job_id}/audio"} if job["status"] == "done" else None
+    else:
+        # Apply ?fields= / ?exclude= without touching the stored result
+        job["events"] = [dict(event, article=select_article_fields([event["article"]])[0])
+                         if event["event"] == "article" else event for event in job["events"]]
+        if job["result"] is not None:
+            job["result"] = select_fields(dict(job["result"]))
+            job["etag"] = generate_etag(json.dumps(job["result"], sort_keys=True).encode())
+    return jsonify(job)
+
+
+@app.route("/jobs/<job_id>/audio", methods=["GET"])
+def job_audio(job_id):
+    """Download the audio produced by a finished TTS job"""
+    job = get_job(job_id)
+    if job is None or job["kind"] != "tts":
+        return jsonify({"error": "Unknown or expired job"}), 404
+    if job["status"] != "done":
+        return jsonify({"error": f"Job is {job['status']}"}), 409
+
+    return audio_response(job["result"], "final_analysis.mp3")
+
+
+@app.route("/metrics", methods=["GET"])
+def metrics():
+    """Expose stage latency histograms and cache counters for Prometheus"""
+    return Response(render_metrics(), mimetype="text/plain; version=0.0.4")
+
+
+@app.route("/startup", methods=["GET"])
+def startup_report():
+    """Report import and client initialization times for this worker process"""
+    return jsonify(get_startup_report())
+
+
 if __name__ == "__main__":
+    cleanup_tts_files()
+    # Create the clients named in WARMUP_CLIENTS now instead of on the first request
+    print(f"Startup report: {json.dumps(warm_up())}")
     app.run(debug=True)
\ No newline at end of file
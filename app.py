@@ -1,100 +1,204 @@
 import streamlit as st
 import requests
 import json
-import os
-import tempfile
 
 BACKEND_URL = "http://127.0.0.1:5000"
+# Seconds each long-poll of a background job may block on the backend
+JOB_POLL_WAIT = 20
+# Article fields the app displays; the backend leaves the rest (e.g. content) out
+ARTICLE_FIELDS = "Title,Summary,Sentiment,Topics,source,url"
 
 st.set_page_config(page_title="News Analysis", layout="wide")
 st.title("News Summarization & Sentiment Analysis")
 
 company = st.text_input("Enter Company Name", "")
 
+# Results survive Streamlit reruns: analyses are kept per company together with
+# the ETag of the job result, and Hindi audio per final sentiment text
+if "news_cache" not in st.session_state:
+    st.session_state["news_cache"] = {}
+if "audio_cache" not in st.session_state:
+    st.session_state["audio_cache"] = {}
+
+
+def render_article(i, article):
+    """Render one processed article (partial ones are still waiting for their summary and topics)"""
+    st.write(f"### Article {i + 1}: {article['Title']}")
+    if article.get("Summary") is None:
+        st.write("**Summary:** *summarizing...*")
+    else:
+        st.write(f"**Summary:** {article['Summary']}")
+    st.write(f"**Sentiment:** {article['Sentiment']}")
+    if article.get("Summary") is not None:
+        st.write(f"**Topics:** {', '.join(article['Topics'])}")
+    st.write("---")
+
+
+def poll_job(job_id):
+    """Long-poll a backend job, yielding its progress events as they arrive
+
+    The last event is {"event": "job", ...} with the final status, error and
+    the ETag of the result.
+    """
+    since = 0
+    while True:
+        response = requests.get(f"{BACKEND_URL}/jobs/{job_id}",
+                                params={"wait": JOB_POLL_WAIT, "since": since, "fields": ARTICLE_FIELDS},
+                                timeout=JOB_POLL_WAIT + 10)
+        if response.status_code != 200:
+            yield {"event": "job", "status": "failed", "error": response.text}
+            return
+
+        job = response.json()
+        yield from job["events"]
+        since = job["next"]
+        if job["status"] in ("done", "failed"):
+            yield {"event": "job", "status": job["status"], "error": job["error"], "etag": job.get("etag")}
+            return
+
+
+def render_articles(data):
+    """Render the article grid of a finished analysis"""
+    st.subheader(f"News for {data['Company']}")
+    st.header("News Articles")
+    cols = st.columns(2)
+    for i, article in enumerate(data["Articles"]):
+        with cols[i % 2]:
+            render_article(i, article)
+
+
+def analyze_with_job(company):
+    """Run the analysis as a backend job, rendering articles as soon as the job reports them
+
+    Returns {"data", "etag"}, or None if the job failed.
+    """
+    response = requests.post(f"{BACKEND_URL}/jobs/news", json={"company": company})
+    if response.status_code != 202:
+        st.error(f"Failed to fetch news: {response.text}")
+        return None
+
+    data = {"Company": company, "Articles": [], "Comparative Sentiment Score": {}}
+    articles = {}
+    slots = []
+    etag = None
+
+    for event in poll_job(response.json()["job_id"]):
+        if event["event"] == "start":
+            data["Company"] = event["Company"]
+
+            # Display the data in a formatted way
+            st.subheader(f"News for {data['Company']}")
+
+            # Display articles in a cleaner format
+            st.header("News Articles")
+
+            # Use columns to display articles side by side
+            cols = st.columns(2)
+            slots = [cols[i % 2].empty() for i in range(event["count"])]
+        elif event["event"] == "article":
+            # A partial article is rendered at once and replaced when its summary arrives
+            articles[event["index"]] = event["article"]
+            with slots[event["index"]].container():
+                render_article(event["index"], event["article"])
+        elif event["event"] == "analysis":
+            data["Comparative Sentiment Score"] = event["Comparative Sentiment Score"]
+        elif event["event"] == "job":
+            if event["status"] == "failed":
+                st.error(f"News analysis failed: {event['error']}")
+                return None
+            etag = event["etag"]
+
+    data["Articles"] = [articles[i] for i in sorted(articles)]
+    return {"data": data, "etag": etag}
+
+
+def hindi_audio(analysis):
+    """Return MP3 bytes for the final sentiment analysis, generating them only once per text"""
+    text = analysis.get("Final Sentiment Analysis", "")
+    audio = st.session_state["audio_cache"].get(text)
+    if audio is not None:
+        return audio
+
+    tts_response = requests.post(f"{BACKEND_URL}/jobs/tts-final", json={"analysis": analysis})
+    if tts_response.status_code == 202:
+        # Wait for the job, then download its audio
+        job_id = tts_response.json()["job_id"]
+        for _ in poll_job(job_id):
+            pass
+        tts_response = requests.get(f"{BACKEND_URL}/jobs/{job_id}/audio")
+
+    if tts_response.status_code != 200:
+        st.error(f"Failed to generate Hindi speech. Error: {tts_response.text}")
+        return None
+    st.session_state["audio_cache"][text] = tts_response.content
+    return tts_response.content
+
+
+def render_analysis(company, data):
+    """Render the comparative analysis, Hindi audio and export of a finished analysis"""
+    # Display Comparative Analysis
+    st.header("Comparative Analysis")
+
+    # Coverage Differences - Detailed format
+    st.subheader("Detailed Article Comparisons")
+
+    for diff in data['Comparative Sentiment Score'].get('Coverage Differences', []):
+        with st.container():
+            st.markdown(f"#### Comparing Articles {diff.get('Articles', '')}")
+            st.markdown(f"**Content Comparison:** {diff['Comparison']}")
+            st.markdown(f"**Potential Impact:** {diff['Impact']}")
+            st.write("---")
+
+    # Topic Overlap
+    st.subheader("Topic Analysis")
+    topic_overlap = data['Comparative Sentiment Score'].get('Topic Overlap', {})
+
+    common_topics = topic_overlap.get('Common Topics', [])
+    if common_topics:
+        st.write(f"**Common Topics Across Articles:** {', '.join(common_topics)}")
+    else:
+        st.write("**No common topics found across articles**")
+
+    # Final Sentiment Analysis with Hindi Audio
+    st.header("Final Sentiment Analysis")
+    final_sentiment = data['Comparative Sentiment Score'].get('Final Sentiment Analysis',
+                                                              'No analysis available')
+
+    # Display the final sentiment in a prominent way
+    st.markdown(f"### {final_sentiment}")
+
+    # Generate Hindi speech for final sentiment analysis
+    with st.spinner("Generating Hindi audio for final analysis..."):
+        audio = hindi_audio(data['Comparative Sentiment Score'])
+        if audio is not None:
+            # Play the audio straight from the response bytes
+            st.audio(audio, format="audio/mp3")
+            st.write("▶️ **Hindi Audio Summary**")
+
+    # Export JSON option
+    st.header("Export Results")
+    st.download_button(
+        label="Download JSON",
+        data=json.dumps(data, indent=2),
+        file_name=f"{company}_news_analysis.json",
+        mime="application/json"
+    )
+
+
+company_key = " ".join(company.lower().split())
+cached = st.session_state["news_cache"].get(company_key)
+
 if st.button("Fetch News"):
     if company:
+        # Refreshes run as jobs too; the backend only analyzes articles it has not seen for this company
         with st.spinner("Fetching and analyzing news articles..."):
-            response = requests.get(f"{BACKEND_URL}/news?company={company}")
-            if response.status_code == 200:
-                data = response.json()
-
-                # Display the data in a formatted way
-                st.subheader(f"News for {data['Company']}")
-
-                # Display articles in a cleaner format
-                st.header("News Articles")
-
-                # Use columns to display articles side by side
-                cols = st.columns(2)
-
-                for i, article in enumerate(data['Articles']):
-                    with cols[i % 2]:
-                        st.write(f"### Article {i + 1}: {article['Title']}")
-                        st.write(f"**Summary:** {article['Summary']}")
-                        st.write(f"**Sentiment:** {article['Sentiment']}")
-                        st.write(f"**Topics:** {', '.join(article['Topics'])}")
-                        st.write("---")
-
-                # Display Comparative Analysis
-                st.header("Comparative Analysis")
-
-                # Coverage Differences - Detailed format
-                st.subheader("Detailed Article Comparisons")
-
-                for diff in data['Comparative Sentiment Score'].get('Coverage Differences', []):
-                    with st.container():
-                        st.markdown(f"#### Comparing Articles {diff.get('Articles', '')}")
-                        st.markdown(f"**Content Comparison:** {diff['Comparison']}")
-                        st.markdown(f"**Potential Impact:** {diff['Impact']}")
-                        st.write("---")
-
-                # Topic Overlap
-                st.subheader("Topic Analysis")
-                topic_overlap = data['Comparative Sentiment Score'].get('Topic Overlap', {})
-
-                common_topics = topic_overlap.get('Common Topics', [])
-                if common_topics:
-                    st.write(f"**Common Topics Across Articles:** {', '.join(common_topics)}")
-                else:
-                    st.write("**No common topics found across articles**")
-
-                # Final Sentiment Analysis with Hindi Audio
-                st.header("Final Sentiment Analysis")
-                final_sentiment = data['Comparative Sentiment Score'].get('Final Sentiment Analysis',
-                                                                          'No analysis available')
-
-                # Display the final sentiment in a prominent way
-                st.markdown(f"### {final_sentiment}")
-
-                # Generate Hindi speech for final sentiment analysis
-                with st.spinner("Generating Hindi audio for final analysis..."):
-                    # Create a temporary file to save the audio
-                    temp_audio_file = os.path.join(tempfile.gettempdir(), "final_analysis.mp3")
-
-                    tts_response = requests.post(
-                        f"{BACKEND_URL}/tts-final",
-                        json={"analysis": data['Comparative Sentiment Score']}
-                    )
-
-                    if tts_response.status_code == 200:
-                        # Save the audio content to the temporary file
-                        with open(temp_audio_file, "wb") as f:
-                            f.write(tts_response.content)
-
-                        # Display the audio player
-                        st.audio(temp_audio_file, format="audio/mp3")
-                        st.write("▶️ **Hindi Audio Summary**")
-                    else:
-                        st.error(f"Failed to generate Hindi speech. Error: {tts_response.text}")
-
-                # Export JSON option
-                st.header("Export Results")
-                st.download_button(
-                    label="Download JSON",
-                    data=json.dumps(data, indent=2),
-                    file_name=f"{company}_news_analysis.json",
-                    mime="application/json"
-                )
-
-            else:
-                st.error(f"Failed to fetch news: {response.text}")
\ No newline at end of file
+            result = analyze_with_job(company)
+        if result is not None:
+            if cached is not None and result["etag"] and result["etag"] == cached["etag"]:
+                st.info("No new articles since the last fetch.")
+            st.session_state["news_cache"][company_key] = result
+            render_analysis(company, result["data"])
+elif cached is not None:
+    # Streamlit reran the script (e.g. after a download); show the stored result without calling the backend
+    render_articles(cached["data"])
+    render_analysis(company, cached["data"])
@@ -0,0 +1,274 @@
+"""Benchmark /news and /tts-final offline against local stand-ins for every external service
+
+Run from the repository root:
+
+    python benchmarks/offline_pipeline.py [--concurrency 1,2,4,8] [--requests 16] [--output results.json]
+
+NewsAPI and the publisher pages are served by a local HTTP server; Gemini,
+googletrans and gTTS are replaced by in-process fakes through
+utils.override_client. Each stand-in has a configurable latency and failure
+rate, and pages have a configurable size, so runs are repeatable without API
+keys or network access. Every request uses a different company name, so the
+caches only help where they would help with real traffic.
+
+The endpoints are driven through Flask's test client at each concurrency
+level. Latency percentiles and throughput per endpoint and level, plus
+per-stage percentiles from the utils timing spans, are written as JSON to stdout (or --output) for
+comparison between runs; a readable summary goes to stderr.
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+WORDS = ("the company said revenue grew while analysts expect margins to improve as demand for electric "
+         "vehicles and batteries rises but regulators and investors remain cautious about new risks").split()
+
+
+def percentiles(values):
+    """Nearest-rank p50/p90/p99 plus mean and max of a list of seconds"""
+    if not values:
+        return {"count": 0}
+    ordered = sorted(values)
+
+    def rank(p):
+        return ordered[min(len(ordered) - 1, max(0, int(round(p / 100 * len(ordered))) - 1))]
+
+    return {"count": len(ordered), "p50": rank(50), "p90": rank(90), "p99": rank(99),
+            "mean": sum(ordered) / len(ordered), "max": ordered[-1]}
+
+
+class StandIn:
+    """Sleep for a jittered latency and fail at a configured rate"""
+
+    def __init__(self, latency, failure_rate, seed):
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+
+    def wait(self):
+        with self.lock:
+            delay = self.latency * self.rng.uniform(0.5, 1.5)
+            failed = self.rng.random() < self.failure_rate
+        time.sleep(delay)
+        return failed
+
+
+def make_server(args):
+    """Start a local server for NewsAPI (/v2/everything) and article pages (/article/...)"""
+    newsapi = StandIn(args.newsapi_latency, args.newsapi_failure_rate, args.seed)
+    pages = StandIn(args.page_latency, args.page_failure_rate, args.seed + 1)
+
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *_):
+            pass
+
+        def reply(self, status, body, content_type):
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            url = urlsplit(self.path)
+            if url.path == "/v2/everything":
+                if newsapi.wait():
+                    return self.reply(503, b"{}", "application/json")
+                company = parse_qs(url.query).get("q", ["Company"])[0]
+                port = self.server.server_address[1]
+                articles = [{
+                    "title": f"{company} {' '.join(random.Random(f'{company}{i}').sample(WORDS, 6))}",
+                    "url": f"http://127.0.0.1:{port}/article/{company.replace(' ', '-')}/{i}",
+                    "publishedAt": f"2024-01-{i % 28 + 1:02d}T00:00:00Z",
+                    "source": {"name": "Local Wire"},
+                } for i in range(args.articles)]
+                return self.reply(200, json.dumps({"articles": articles}).encode(), "application/json")
+
+            if pages.wait():
+                return self.reply(500, b"error", "text/html")
+            rng = random.Random(url.path)
+            paragraphs = []
+            size = 0
+            while size < args.page_kb * 1024:
+                paragraph = f"<p>{' '.join(rng.choice(WORDS) for _ in range(60))}.</p>"
+                paragraphs.append(paragraph)
+                size += len(paragraph)
+            body = (f"<html><head><script>var x = 1;</script></head><body><nav><p>Menu</p></nav>"
+                    f"{''.join(paragraphs)}</body></html>").encode()
+            self.reply(200, body, "text/html; charset=utf-8")
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+class FakeResponse:
+    def __init__(self, text):
+        self.text = text
+
+
+class FakeGemini:
+    """Answers each prompt type the pipeline sends with a well-formed response"""
+
+    def __init__(self, args):
+        self.stand_in = StandIn(args.llm_latency, args.llm_failure_rate, args.seed + 2)
+
+    def generate_content(self, prompt, *_, **__):
+        if self.stand_in.wait():
+            raise RuntimeError("429 Resource has been exhausted (benchmark stand-in)")
+        if "one object per pair" in prompt:
+            pairs = prompt.split("For each of these article pairs: ", 1)[1].split("\n", 1)[0].split(", ")
+            return FakeResponse(json.dumps([{"articles": pair, "comparison": f"Articles {pair} differ in focus.",
+                                             "impact": "Investors may react differently."} for pair in pairs]))
+        if "one object per article" in prompt:
+            count = int(prompt.split("Analyze each of the following ", 1)[1].split(" ", 1)[0])
+            return FakeResponse(json.dumps([{"id": i + 1, "summary": "A concise benchmark summary.",
+                                             "topics": ["Innovation", "Stock Market"]} for i in range(count)]))
+        if "JSON array of strings" in prompt:
+            return FakeResponse('["Innovation", "Stock Market"]')
+        return FakeResponse("A concise benchmark summary of the article.")
+
+
+class FakeTranslator:
+    def __init__(self, args):
+        self.stand_in = StandIn(args.translate_latency, args.translate_failure_rate, args.seed + 3)
+
+    def translate(self, text, dest="hi"):
+        if self.stand_in.wait():
+            raise RuntimeError("translation stand-in failure")
+        return FakeResponse(text)
+
+
+def make_fake_gtts(args):
+    stand_in = StandIn(args.tts_latency, args.tts_failure_rate, args.seed + 4)
+
+    class FakeGTTS:
+        def __init__(self, text, lang="en", slow=False, tld="com"):
+            self.text = text
+
+        def write_to_fp(self, fp):
+            if stand_in.wait():
+                raise RuntimeError("gTTS stand-in failure")
+            # Roughly the size of a real 32 kbit/s MP3 at normal speaking rate
+            fp.write(b"\xff\xfb" * (len(self.text) * 160))
+
+    return FakeGTTS
+
+
+def drive(app, utils, endpoint, concurrency, count, offset):
+    """Send count requests to one endpoint with the given concurrency
+
+    Returns (latencies, errors, seconds, {stage: [span seconds]}); stage spans
+    come from utils.collect_timings around each request.
+    """
+
+    def one(n):
+        company = f"Benchmark Company {offset + n}"
+        client = app.test_client()
+        with utils.collect_timings() as timings:
+            if endpoint == "/news":
+                response = client.get("/news", query_string={"company": company})
+            else:
+                analysis = {"Final Sentiment Analysis":
+                            f"{company}'s latest news coverage is mostly positive. Potential stock growth expected."}
+                response = client.post("/tts-final", json={"analysis": analysis})
+            response.get_data()
+        return timings, response.status_code != 200
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        outcomes = list(pool.map(one, range(count)))
+    elapsed = time.perf_counter() - started
+
+    stages = {}
+    for timings, _ in outcomes:
+        for entry in timings["spans"]:
+            stages.setdefault(entry["stage"], []).append(entry["seconds"])
+    latencies = [timings["total_seconds"] for timings, _ in outcomes]
+    return latencies, sum(failed for _, failed in outcomes), elapsed, stages
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--concurrency", default="1,2,4,8", help="comma-separated concurrency levels")
+    parser.add_argument("--requests", type=int, default=16, help="requests per endpoint and level")
+    parser.add_argument("--endpoints", default="/news,/tts-final")
+    parser.add_argument("--articles", type=int, default=10, help="articles returned by the NewsAPI stand-in")
+    parser.add_argument("--page-kb", type=int, default=60)
+    parser.add_argument("--newsapi-latency", type=float, default=0.15)
+    parser.add_argument("--newsapi-failure-rate", type=float, default=0.0)
+    parser.add_argument("--page-latency", type=float, default=0.2)
+    parser.add_argument("--page-failure-rate", type=float, default=0.05)
+    parser.add_argument("--llm-latency", type=float, default=0.8)
+    parser.add_argument("--llm-failure-rate", type=float, default=0.02)
+    parser.add_argument("--translate-latency", type=float, default=0.2)
+    parser.add_argument("--translate-failure-rate", type=float, default=0.0)
+    parser.add_argument("--tts-latency", type=float, default=0.5)
+    parser.add_argument("--tts-failure-rate", type=float, default=0.0)
+    parser.add_argument("--with-caches", action="store_true",
+                        help="keep the content, LLM and incremental refresh caches enabled")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="write the JSON report here instead of stdout")
+    args = parser.parse_args()
+
+    # Settings are read when utils is imported, so they are applied first
+    os.environ["NEWS_CACHE_DIR"] = tempfile.mkdtemp(prefix="news_benchmark_")
+    os.environ.setdefault("NEWS_API_KEY", "benchmark")
+    if not args.with_caches:
+        for name in ("CONTENT_CACHE", "LLM_CACHE", "NEWS_INCREMENTAL"):
+            os.environ[name] = "0"
+
+    import api
+    import utils
+
+    server = make_server(args)
+    utils.NEWS_API_URL = f"http://127.0.0.1:{server.server_address[1]}/v2/everything"
+    utils.override_client("model", FakeGemini(args))
+    utils.override_client("translator", FakeTranslator(args))
+    utils.override_client("gtts", make_fake_gtts(args))
+
+    results = []
+    offset = 0
+    for endpoint in args.endpoints.split(","):
+        for concurrency in [int(level) for level in args.concurrency.split(",")]:
+            latencies, errors, elapsed, stages = drive(api.app, utils, endpoint, concurrency, args.requests, offset)
+            offset += args.requests
+            result = {
+                "endpoint": endpoint,
+                "concurrency": concurrency,
+                "requests": args.requests,
+                "errors": errors,
+                "seconds": elapsed,
+                "throughput_rps": args.requests / elapsed,
+                "latency": percentiles(latencies),
+                "stages": {stage: percentiles(values) for stage, values in sorted(stages.items())},
+            }
+            results.append(result)
+            print(f"{endpoint:<11} c={concurrency:<3} {result['throughput_rps']:7.2f} req/s  "
+                  f"p50 {result['latency']['p50'] * 1000:8.1f} ms  p90 {result['latency']['p90'] * 1000:8.1f} ms  "
+                  f"p99 {result['latency']['p99'] * 1000:8.1f} ms  errors {errors}", file=sys.stderr)
+
+    server.shutdown()
+    config = {key: value for key, value in vars(args).items() if key != "output"}
+    report = json.dumps({"config": config, "results": results}, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(report + "\n")
+    else:
+        print(report)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,166 @@
+"""Benchmark the compiled rule-based topic matcher against the original implementation
+
+Run from the repository root:
+
+    python benchmarks/topic_matcher.py [--documents 2000] [--repeat 5] [--extra-topics 100]
+
+Each run is repeated with the default taxonomy and with a larger one padded
+with synthetic topics, to show how both implementations scale with taxonomy
+size. The original implementation did a substring scan per keyword and also
+matched short keywords inside words ("ev" in "every"); the agreement figure
+shows how often the two still return the same topics for the default taxonomy.
+The run fails if any document disagrees for another reason, or if one of the
+HEADLINES below (inflected keywords the synthetic documents never contain)
+misses its topic.
+"""
+import argparse
+import os
+import random
+import re
+import string
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import utils  # noqa: E402
+
+
+def legacy_rule_based_topic_extraction(title, content, topic_keywords):
+    """The substring-scan implementation the compiled matcher replaced"""
+    found_topics = []
+    combined_text = (title + " " + content[:500]).lower()
+    for topic, keywords in topic_keywords.items():
+        if any(keyword in combined_text for keyword in keywords):
+            found_topics.append(topic)
+    return found_topics[:3] if found_topics else ["Company News"]
+
+
+# Headlines whose inflected keywords must still be found, with the topic each one needs
+HEADLINES = [
+    ("Tesla sells record number of EVs", "Electric Vehicles"),
+    ("Tesla announced a partnership with Panasonic", "Partnerships"),
+    ("Microsoft unveiled new technologies", "Innovation"),
+    ("Ford launched its truck despite regulatory concerns", "Regulations"),
+    ("Tech CEOs meet in Washington", "Leadership"),
+    ("Board appointed a new chief financial officer", "Leadership"),
+    ("New emissions laws take effect", "Regulations"),
+    ("Tesla faces lawsuit over Autopilot", "Regulations"),
+    ("Lawmakers question the automaker", "Regulations"),
+]
+
+
+def legacy_with_whole_short_keywords(title, content, topic_keywords):
+    """The legacy scan, except that short keywords must be whole words (or their plural)
+
+    This is the only intended difference from the compiled matcher, so the two
+    must agree on every document.
+    """
+    found_topics = []
+    combined_text = (title + " " + content[:500]).lower()
+    for topic, keywords in topic_keywords.items():
+        if any(re.search(rf"\b{re.escape(keyword)}s?\b", combined_text)
+               if len(keyword) <= utils._TOPIC_EXACT_MAX_LENGTH else keyword in combined_text
+               for keyword in keywords):
+            found_topics.append(topic)
+    return found_topics[:3] if found_topics else ["Company News"]
+
+
+FILLER = ("the company said on monday that it would continue to review its plans for the coming year "
+          "while analysts expect results to remain broadly in line with previous guidance").split()
+
+
+def make_documents(count, seed):
+    """Build synthetic (title, content) pairs mixing keywords and filler words"""
+    rng = random.Random(seed)
+    keywords = [keyword for keywords in utils.DEFAULT_TOPIC_KEYWORDS.values() for keyword in keywords]
+    documents = []
+    for _ in range(count):
+        words = [rng.choice(FILLER) for _ in range(120)]
+        for _ in range(rng.randint(0, 6)):
+            words.insert(rng.randrange(len(words)), rng.choice(keywords))
+        title = " ".join(rng.choice(FILLER + keywords) for _ in range(10)).title()
+        documents.append((title, " ".join(words)))
+    return documents
+
+
+def make_taxonomy(extra_topics, seed):
+    """Return the default taxonomy padded with synthetic topics of random keywords"""
+    rng = random.Random(seed)
+    taxonomy = dict(utils.DEFAULT_TOPIC_KEYWORDS)
+    for n in range(extra_topics):
+        taxonomy[f"Synthetic Topic {n}"] = [
+            "".join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(4, 9))) for _ in range(5)
+        ]
+    return taxonomy
+
+
+def best_of(repeat, func):
+    """Return the fastest wall-clock time of several runs"""
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - started)
+    return min(timings)
+
+
+def run(documents, taxonomy, repeat):
+    """Time the three implementations against one taxonomy"""
+    utils.load_topic_taxonomy(taxonomy)
+    results = {
+        "legacy (per-keyword substring scan)": best_of(
+            repeat, lambda: [legacy_rule_based_topic_extraction(t, c, taxonomy) for t, c in documents]),
+        "compiled (per document)": best_of(
+            repeat, lambda: [utils.rule_based_topic_extraction(t, c) for t, c in documents]),
+        "compiled batch": best_of(
+            repeat, lambda: utils.rule_based_topic_extraction_batch(documents)),
+    }
+
+    baseline = results["legacy (per-keyword substring scan)"]
+    keywords = sum(len(keywords) for keywords in taxonomy.values())
+    print(f"{len(taxonomy)} topics / {keywords} keywords, {len(documents)} documents, best of {repeat} runs")
+    for name, seconds in results.items():
+        per_doc = seconds / len(documents) * 1e6
+        print(f"  {name:<38} {seconds * 1000:8.2f} ms  {per_doc:7.2f} us/doc  {baseline / seconds:5.2f}x")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--documents", type=int, default=2000)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--extra-topics", type=int, default=100)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    documents = make_documents(args.documents, args.seed)
+
+    run(documents, utils.DEFAULT_TOPIC_KEYWORDS, args.repeat)
+    if args.extra_topics:
+        run(documents, make_taxonomy(args.extra_topics, args.seed), args.repeat)
+
+    utils.load_topic_taxonomy(utils.DEFAULT_TOPIC_KEYWORDS)
+    agree = sum(
+        legacy_rule_based_topic_extraction(t, c, utils.DEFAULT_TOPIC_KEYWORDS)
+        == utils.rule_based_topic_extraction(t, c) for t, c in documents
+    )
+    unexplained = [
+        (t, c) for t, c in documents
+        if legacy_with_whole_short_keywords(t, c, utils.DEFAULT_TOPIC_KEYWORDS) != utils.rule_based_topic_extraction(t, c)
+    ]
+    batch_matches = utils.rule_based_topic_extraction_batch(documents) == [
+        utils.rule_based_topic_extraction(t, c) for t, c in documents
+    ]
+    print(f"identical topics to legacy: {agree / len(documents):.1%} "
+          f"(differences come from short keywords no longer matching inside words)")
+    missed = [(title, topic) for title, topic in HEADLINES
+              if topic not in utils.rule_based_topic_extraction(title, "")]
+    print(f"documents differing for any other reason: {len(unexplained)}")
+    print(f"headlines missing their topic: {missed or 0}")
+    print(f"batch API matches single-document API: {batch_matches}")
+    if unexplained or missed or not batch_matches:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
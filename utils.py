@@ -1,72 +1,1193 @@
+import time
+
+_IMPORT_STARTED = time.perf_counter()
+
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import os
 import json
-from bs4 import BeautifulSoup
-from gtts import gTTS
-from vaderSentiment.vaderSentiment import SentimentIntensityAnalyzer
+import re
+import string
 from dotenv import load_dotenv
-from googletrans import Translator
-import google.generativeai as genai
+import importlib
 import uuid
-from collections import Counter
+from collections import Counter, OrderedDict
+from concurrent.futures import (Future, ProcessPoolExecutor, ThreadPoolExecutor, TimeoutError as FutureTimeoutError,
+                                as_completed)
+from contextlib import contextmanager
+import asyncio
+import codecs
+import contextvars
+import hashlib
+import heapq
+import inspect
+import io
+import itertools
+import random
+import sqlite3
 import tempfile
+import threading
+from collections import deque
+from datetime import datetime, timezone
+from html.parser import HTMLParser
+from urllib.parse import urlsplit
+
+try:
+    from lxml import etree
+except ImportError:  # lxml is optional; fall back to the standard library parser
+    etree = None
 
 # Load environment variables
 load_dotenv()
 
-# Initialize sentiment analyzer and translator
-analyzer = SentimentIntensityAnalyzer()
-translator = Translator()
+GEMINI_MODEL_NAME = os.getenv("GEMINI_MODEL", "gemini-pro")
 
-# Configure Gemini API
-genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
-model = genai.GenerativeModel('gemini-pro')
+# Heavy third-party clients (VADER, googletrans, Gemini, gTTS) are imported and
+# built on first use, once per process and thread-safely; see get_client().
+# WARMUP_CLIENTS lists the ones warm_up() should create eagerly ("all" for every one).
+WARMUP_CLIENTS = os.getenv("WARMUP_CLIENTS", "")
 
+_clients = {}
+_client_overrides = {}
+_clients_lock = threading.Lock()
+_startup_timings = {"imports": {}, "clients": {}}
 
-def fetch_news(company_name):
-    """Fetch news articles from NewsAPI"""
-    api_key = os.getenv("NEWS_API_KEY")
-    url = f"https://newsapi.org/v2/everything?q={company_name}&language=en&apiKey={api_key}"
 
-    response = requests.get(url)
-    if response.status_code == 200:
-        articles = response.json().get("articles", [])
-        processed_articles = []
+def _env_int(name, default):
+    """Read an integer setting from the environment, falling back to default"""
+    try:
+        return int(os.getenv(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+def _env_float(name, default):
+    """Read a float setting from the environment, falling back to default"""
+    try:
+        return float(os.getenv(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+def _timed_import(module_name):
+    """Import a module, recording how long the first import took"""
+    started = time.perf_counter()
+    module = importlib.import_module(module_name)
+    _startup_timings["imports"].setdefault(module_name, time.perf_counter() - started)
+    return module
+
+
+def _create_analyzer():
+    return _timed_import("vaderSentiment.vaderSentiment").SentimentIntensityAnalyzer()
+
+
+def _create_translator():
+    return _timed_import("googletrans").Translator()
+
+
+def _create_model():
+    genai = _timed_import("google.generativeai")
+    genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
+    return genai.GenerativeModel(GEMINI_MODEL_NAME)
+
+
+def _create_gtts():
+    return _timed_import("gtts").gTTS
+
+
+_CLIENT_FACTORIES = {
+    "analyzer": _create_analyzer,
+    "translator": _create_translator,
+    "model": _create_model,
+    "gtts": _create_gtts,
+}
+
+
+def get_client(name):
+    """Return the named client ("analyzer", "translator", "model" or "gtts"), creating it on first use"""
+    client = _client_overrides.get(name) or _clients.get(name)
+    if client is not None:
+        return client
+
+    with _clients_lock:
+        client = _clients.get(name)
+        if client is None:
+            started = time.perf_counter()
+            client = _CLIENT_FACTORIES[name]()
+            _startup_timings["clients"][name] = time.perf_counter() - started
+            _clients[name] = client
+    return client
 
-        # Limit to 4 articles as requested
-        for art in articles[:4]:
+
+def override_client(name, client):
+    """Replace a client in this process (e.g. with a fake for tests); None restores the real one"""
+    if name not in _CLIENT_FACTORIES:
+        raise KeyError(name)
+    if client is None:
+        _client_overrides.pop(name, None)
+    else:
+        _client_overrides[name] = client
+
+
+def _reset_clients_after_fork():
+    """Drop clients inherited from the parent so each process builds its own"""
+    global _clients_lock, _translation_loop
+    _clients_lock = threading.Lock()
+    _clients.clear()
+    # The async translator's event loop thread does not survive a fork either
+    _translation_loop = None
+    _startup_timings["clients"].clear()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_clients_after_fork)
+
+
+def __getattr__(name):
+    # Keep utils.analyzer / utils.translator / utils.model working for callers
+    # that used the old eagerly created module globals
+    if name in ("analyzer", "translator", "model"):
+        return get_client(name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def warm_up(names=None):
+    """Create clients eagerly and return the startup report
+
+    names defaults to the comma-separated WARMUP_CLIENTS setting; "all" warms
+    every client. Run it in each worker process after forking.
+    """
+    if names is None:
+        names = [name.strip() for name in WARMUP_CLIENTS.split(",") if name.strip()]
+    if "all" in names:
+        names = list(_CLIENT_FACTORIES)
+    for name in names:
+        try:
+            get_client(name)
+        except Exception as e:
+            print(f"Warm-up Error ({name}): {e}")
+    return get_startup_report()
+
+
+def get_startup_report():
+    """Return how long importing utils took and how long each client took to import and build"""
+    return {
+        "pid": os.getpid(),
+        "utils_import_seconds": _startup_timings.get("utils_import"),
+        "module_imports": dict(_startup_timings["imports"]),
+        "clients": {name: {"initialized": name in _clients or name in _client_overrides,
+                           "seconds": _startup_timings["clients"].get(name)}
+                    for name in _CLIENT_FACTORIES},
+    }
+
+
+_stats_lock = threading.Lock()
+
+
+def _bump(counter, key, amount=1):
+    """Increment a shared statistics counter"""
+    with _stats_lock:
+        counter[key] += amount
+
+
+# Per-article pipeline concurrency. NEWS_MAX_WORKERS bounds the shared worker
+# pool; the per-stage limits bound how many workers may be inside one stage at
+# the same time (0 means "no tighter than the pool").
+NEWS_CONCURRENT = os.getenv("NEWS_CONCURRENT", "1") != "0"
+NEWS_MAX_WORKERS = max(1, _env_int("NEWS_MAX_WORKERS", 8))
+NEWS_BATCH_ANALYSIS = os.getenv("NEWS_BATCH_ANALYSIS", "1") != "0"
+NEWS_MAX_ARTICLES = max(1, _env_int("NEWS_MAX_ARTICLES", 4))
+# Near-duplicate detection: NewsAPI results whose title or scraped content
+# SimHash fingerprints differ in at most DEDUP_*_DISTANCE of 64 bits are
+# collapsed into the first copy, and the freed slots are refilled.
+NEWS_DEDUP = os.getenv("NEWS_DEDUP", "1") != "0"
+DEDUP_TITLE_DISTANCE = _env_int("DEDUP_TITLE_DISTANCE", 3)
+DEDUP_CONTENT_DISTANCE = _env_int("DEDUP_CONTENT_DISTANCE", 3)
+# Shorter titles are too generic to collapse articles on their own
+DEDUP_TITLE_MIN_TOKENS = _env_int("DEDUP_TITLE_MIN_TOKENS", 6)
+_TITLE_SOURCE_SUFFIX = re.compile(r"\s+[-|\u2013\u2014]\s+([^-|\u2013\u2014]{1,60})$")
+_FINGERPRINT_TOKEN = re.compile(r"[a-z0-9]+")
+# Multi-company batches: up to NEWS_BATCH_MAX_COMPANIES companies per request,
+# coordinated by NEWS_BATCH_WORKERS threads that feed the shared pool above.
+NEWS_BATCH_MAX_COMPANIES = max(1, _env_int("NEWS_BATCH_MAX_COMPANIES", 50))
+NEWS_BATCH_WORKERS = max(1, _env_int("NEWS_BATCH_WORKERS", 4))
+# Article comparisons: pairs inside a group share one Gemini call, and no more
+# than COMPARISON_MAX_LLM_CALLS calls are made per request.
+COMPARISON_GROUP_SIZE = max(2, _env_int("COMPARISON_GROUP_SIZE", 4))
+COMPARISON_MAX_LLM_CALLS = _env_int("COMPARISON_MAX_LLM_CALLS", 3)
+STAGE_LIMITS = {
+    "scrape": _env_int("NEWS_SCRAPE_WORKERS", 0) or NEWS_MAX_WORKERS,
+    "summary": _env_int("NEWS_SUMMARY_WORKERS", 0) or NEWS_MAX_WORKERS,
+    "topics": _env_int("NEWS_TOPICS_WORKERS", 0) or NEWS_MAX_WORKERS,
+    "sentiment": _env_int("NEWS_SENTIMENT_WORKERS", 0) or NEWS_MAX_WORKERS,
+}
+
+_stage_semaphores = {stage: threading.BoundedSemaphore(limit) for stage, limit in STAGE_LIMITS.items()}
+_executor = None
+_executor_lock = threading.Lock()
+_batch_executor = None
+
+# Timing spans: every pipeline stage records its duration into a histogram
+# (exported by render_metrics) and, inside collect_timings(), into a
+# breakdown of the current request.
+METRICS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+_span_histograms = {}
+_metrics_lock = threading.Lock()
+_request_spans = contextvars.ContextVar("request_spans", default=None)
+_batch_stats = Counter(batches=0, companies=0, articles=0, unique_articles=0, analyzed_articles=0)
+_dedup_stats = Counter(candidates=0, title_duplicates=0, content_duplicates=0)
+
+
+def _get_executor():
+    """Return the shared worker pool used by the article pipeline"""
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=NEWS_MAX_WORKERS, thread_name_prefix="news")
+    return _executor
+
+
+def _with_context(func):
+    """Wrap func to run in a copy of the caller's context, so spans reach its collect_timings()"""
+    context = contextvars.copy_context()
+    return lambda *args, **kwargs: context.copy().run(func, *args, **kwargs)
+
+
+def _map(func, items):
+    """Apply func to every item, on the worker pool when concurrency is enabled"""
+    items = list(items)
+    if NEWS_CONCURRENT and len(items) > 1:
+        return list(_get_executor().map(_with_context(func), items))
+    return [func(item) for item in items]
+
+
+def _batch_map(func, items):
+    """Apply func to every item on the batch coordinator threads
+
+    Unlike _map, func may itself use _map: coordinator threads are separate
+    from the shared pool, so they can wait on it without deadlocking.
+    """
+    global _batch_executor
+    items = list(items)
+    if not NEWS_CONCURRENT or len(items) < 2:
+        return [func(item) for item in items]
+    if _batch_executor is None:
+        with _executor_lock:
+            if _batch_executor is None:
+                _batch_executor = ThreadPoolExecutor(max_workers=NEWS_BATCH_WORKERS, thread_name_prefix="batch")
+    return list(_batch_executor.map(_with_context(func), items))
+
+
+@contextmanager
+def span(stage, **details):
+    """Time a block (or, as a decorator, a function) as one occurrence of stage
+
+    The block may add details (e.g. bytes, cache status) to the yielded dict;
+    they are kept with the span in the per-request breakdown.
+    """
+    started = time.perf_counter()
+    try:
+        yield details
+    finally:
+        elapsed = time.perf_counter() - started
+        with _metrics_lock:
+            histogram = _span_histograms.get(stage)
+            if histogram is None:
+                histogram = _span_histograms[stage] = {"buckets": [0] * len(METRICS_BUCKETS), "sum": 0.0, "count": 0}
+            for i, bound in enumerate(METRICS_BUCKETS):
+                if elapsed <= bound:
+                    histogram["buckets"][i] += 1
+            histogram["sum"] += elapsed
+            histogram["count"] += 1
+
+        spans = _request_spans.get()
+        if spans is not None:
+            spans.append(dict(details, stage=stage, seconds=elapsed))
+
+
+@contextmanager
+def collect_timings():
+    """Collect the spans of everything run inside the block (including on worker threads)
+
+    Yields a dict that is filled in when the block exits: total_seconds, the
+    count and summed seconds per stage, and the individual spans. Stages run
+    in parallel, so their seconds can add up to more than the total.
+    """
+    timings = {}
+    spans = []
+    token = _request_spans.set(spans)
+    started = time.perf_counter()
+    try:
+        yield timings
+    finally:
+        _request_spans.reset(token)
+        stages = {}
+        for entry in spans:
+            stage = stages.setdefault(entry["stage"], {"count": 0, "seconds": 0.0})
+            stage["count"] += 1
+            stage["seconds"] += entry["seconds"]
+        timings.update(total_seconds=time.perf_counter() - started, stages=stages, spans=spans)
+
+
+# Counters exported by render_metrics; keys listed in _GAUGE_KEYS are current
+# values rather than running totals.
+_GAUGE_KEYS = {"entries", "memory_entries", "disk_entries", "bytes", "max_bytes", "in_flight", "retained", "waiting",
+               "concurrency_limit", "breaker_open"}
+
+
+def _metric_lines(name, kind, help_text, samples):
+    """Format one metric family; samples are (labels dict, value) pairs"""
+    lines = [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}"]
+    for labels, value in samples:
+        label_text = ",".join(f'{key}="{_escape_label(val)}"' for key, val in labels.items())
+        lines.append(f"{name}{{{label_text}}} {value}" if label_text else f"{name} {value}")
+    return lines
+
+
+def _escape_label(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def render_metrics():
+    """Render stage histograms and cache/queue counters in the Prometheus text format"""
+    with _metrics_lock:
+        histograms = {stage: {"buckets": list(h["buckets"]), "sum": h["sum"], "count": h["count"]}
+                      for stage, h in _span_histograms.items()}
+
+    lines = ["# HELP news_stage_seconds Time spent in each pipeline stage", "# TYPE news_stage_seconds histogram"]
+    for stage, histogram in sorted(histograms.items()):
+        label = _escape_label(stage)
+        for bound, count in zip(METRICS_BUCKETS, histogram["buckets"]):
+            lines.append(f'news_stage_seconds_bucket{{stage="{label}",le="{bound}"}} {count}')
+        lines.append(f'news_stage_seconds_bucket{{stage="{label}",le="+Inf"}} {histogram["count"]}')
+        lines.append(f'news_stage_seconds_sum{{stage="{label}"}} {histogram["sum"]}')
+        lines.append(f'news_stage_seconds_count{{stage="{label}"}} {histogram["count"]}')
+
+    groups = {
+        "llm_cache": get_llm_cache_stats(),
+        "llm_scheduler": get_llm_scheduler_stats(),
+        "content_cache": get_content_cache_stats(),
+        "sentiment_cache": get_sentiment_stats(),
+        "tts_cache": get_tts_cache_stats(),
+        "translation": get_translation_stats(),
+        "scrape": get_scrape_stats()["totals"],
+        "dedup": get_dedup_stats(),
+        "company_state": get_company_state_stats(),
+        "history": get_history_stats(),
+        "batch": get_batch_stats(),
+        "jobs": get_job_stats(),
+    }
+    for group, stats in groups.items():
+        for key, value in sorted(stats.items()):
+            if isinstance(value, bool) or not isinstance(value, (int, float)):
+                continue
+            if key in _GAUGE_KEYS:
+                lines += _metric_lines(f"news_{group}_{key}", "gauge", f"Current {group} {key}", [({}, value)])
+            else:
+                lines += _metric_lines(f"news_{group}_{key}_total", "counter", f"{group} {key}", [({}, value)])
+
+    hosts = get_http_stats()["hosts"]
+    for key, help_text in (("requests", "HTTP requests per host"), ("errors", "Failed HTTP requests per host"),
+                           ("bytes", "Response bytes read per host"),
+                           ("total_seconds", "Seconds spent on HTTP requests per host")):
+        name = "news_http_seconds_total" if key == "total_seconds" else f"news_http_{key}_total"
+        lines += _metric_lines(name, "counter", help_text,
+                               [({"host": host}, stats[key]) for host, stats in sorted(hosts.items())])
+    return "\n".join(lines) + "\n"
+
+
+@contextmanager
+def _stage(name):
+    """Hold one of the stage's concurrency slots for the duration of the block"""
+    with _stage_semaphores[name]:
+        yield
+
+
+# Shared HTTP client used for NewsAPI and article scraping. Connections are
+# pooled per host, every request is bounded by connect/read timeouts and a
+# maximum body size, and idempotent requests are retried with backoff.
+HTTP_CONNECT_TIMEOUT = _env_float("HTTP_CONNECT_TIMEOUT", 5.0)
+HTTP_READ_TIMEOUT = _env_float("HTTP_READ_TIMEOUT", 10.0)
+HTTP_MAX_BYTES = _env_int("HTTP_MAX_BYTES", 5 * 1024 * 1024)
+HTTP_RETRIES = _env_int("HTTP_RETRIES", 2)
+HTTP_BACKOFF = _env_float("HTTP_BACKOFF", 0.3)
+HTTP_POOL_HOSTS = _env_int("HTTP_POOL_HOSTS", 32)
+HTTP_POOL_SIZE = _env_int("HTTP_POOL_SIZE", NEWS_MAX_WORKERS)
+HTTP_USER_AGENT = os.getenv("HTTP_USER_AGENT", "Mozilla/5.0 (compatible; NewsSummarizer/1.0)")
+NEWS_API_URL = os.getenv("NEWS_API_URL", "https://newsapi.org/v2/everything")
+
+_http_session = None
+_http_session_lock = threading.Lock()
+_http_stats = {}
+_http_stats_lock = threading.Lock()
+
+
+class ResponseTooLarge(requests.RequestException):
+    """Raised when a response body exceeds HTTP_MAX_BYTES"""
+
+
+class HttpResponse:
+    """A fully downloaded response returned by http_get"""
+
+    def __init__(self, url, status_code, headers, content, encoding):
+        self.url = url
+        self.status_code = status_code
+        self.headers = headers
+        self.content = content
+        self.encoding = encoding
+
+    @property
+    def text(self):
+        return self.content.decode(self.encoding or "utf-8", errors="replace")
+
+    def json(self):
+        return json.loads(self.text)
+
+
+def _get_http_session():
+    """Return the process-wide pooled requests session"""
+    global _http_session
+    if _http_session is None:
+        with _http_session_lock:
+            if _http_session is None:
+                retry = Retry(
+                    total=HTTP_RETRIES,
+                    backoff_factor=HTTP_BACKOFF,
+                    status_forcelist=(429, 500, 502, 503, 504),
+                    allowed_methods=frozenset(["GET", "HEAD"]),
+                    respect_retry_after_header=True,
+                    raise_on_status=False,
+                )
+                adapter = HTTPAdapter(pool_connections=HTTP_POOL_HOSTS, pool_maxsize=HTTP_POOL_SIZE,
+                                      max_retries=retry)
+                session = requests.Session()
+                session.mount("http://", adapter)
+                session.mount("https://", adapter)
+                session.headers["User-Agent"] = HTTP_USER_AGENT
+                _http_session = session
+    return _http_session
+
+
+def _record_http(host, elapsed, nbytes, error=False):
+    """Add one request to the per-host latency and volume counters"""
+    with _http_stats_lock:
+        stats = _http_stats.setdefault(host, {
+            "requests": 0, "errors": 0, "bytes": 0, "total_seconds": 0.0, "max_seconds": 0.0
+        })
+        stats["requests"] += 1
+        stats["errors"] += int(error)
+        stats["bytes"] += nbytes
+        stats["total_seconds"] += elapsed
+        stats["max_seconds"] = max(stats["max_seconds"], elapsed)
+
+
+@contextmanager
+def http_stream(url, params=None, headers=None, max_bytes=None):
+    """Open a streaming GET through the shared pooled session
+
+    Yields (response, chunks), where chunks iterates over the body and raises
+    ResponseTooLarge once more than max_bytes have been read. The caller may
+    stop reading early; the connection is released when the block exits.
+    """
+    max_bytes = max_bytes or HTTP_MAX_BYTES
+    host = urlsplit(url).netloc
+    started = time.perf_counter()
+    received = [0]
+    error = True
+    try:
+        with _get_http_session().get(url, params=params, headers=headers, stream=True,
+                                     timeout=(HTTP_CONNECT_TIMEOUT, HTTP_READ_TIMEOUT)) as response:
+            declared = response.headers.get("Content-Length")
+            if declared and declared.isdigit() and int(declared) > max_bytes:
+                raise ResponseTooLarge(f"{url} declares {declared} bytes (limit {max_bytes})")
+
+            def chunks():
+                for chunk in response.iter_content(chunk_size=16384):
+                    received[0] += len(chunk)
+                    if received[0] > max_bytes:
+                        raise ResponseTooLarge(f"{url} exceeded {max_bytes} bytes")
+                    yield chunk
+
+            yield response, chunks()
+            error = response.status_code >= 400
+    finally:
+        _record_http(host, time.perf_counter() - started, received[0], error=error)
+
+
+def http_get(url, params=None, headers=None, max_bytes=None):
+    """GET a URL through the shared pooled session and return an HttpResponse
+
+    Raises requests.RequestException (including ResponseTooLarge) on failure.
+    """
+    with http_stream(url, params=params, headers=headers, max_bytes=max_bytes) as (response, chunks):
+        return HttpResponse(response.url, response.status_code, response.headers,
+                            b"".join(chunks), response.encoding)
+
+
+def get_http_stats():
+    """Return per-host latency/volume counters and the state of the connection pools"""
+    with _http_stats_lock:
+        hosts = {}
+        for host, stats in _http_stats.items():
+            hosts[host] = dict(stats, avg_seconds=stats["total_seconds"] / stats["requests"])
+
+    pools = []
+    if _http_session is not None:
+        for adapter in {id(a): a for a in _http_session.adapters.values()}.values():
+            manager = adapter.poolmanager
+            for key in list(manager.pools.keys()):
+                pool = manager.pools.get(key)
+                if pool is None:
+                    continue
+                pools.append({
+                    "host": key.key_host,
+                    "scheme": key.key_scheme,
+                    "connections_opened": pool.num_connections,
+                    "requests": pool.num_requests,
+                    "free_slots": pool.pool.qsize() if pool.pool is not None else 0,
+                    "max_size": HTTP_POOL_SIZE,
+                })
+
+    return {"hosts": hosts, "pools": pools}
+
+
+# Local caches live under NEWS_CACHE_DIR as small SQLite databases so they
+# survive restarts and are shared between worker processes on the same host.
+NEWS_CACHE_DIR = os.getenv("NEWS_CACHE_DIR", os.path.join(tempfile.gettempdir(), "news_summarization_cache"))
+
+
+def _open_sqlite(path, schema):
+    """Open (and create if needed, with its directory) a SQLite database at path"""
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.executescript(schema)
+    return conn
+
+
+def _open_cache_db(filename, schema):
+    """Open (and create if needed) a SQLite database in the cache directory"""
+    return _open_sqlite(os.path.join(NEWS_CACHE_DIR, filename), schema)
+
+
+# Scraped article content, keyed by URL
+CONTENT_CACHE_ENABLED = os.getenv("CONTENT_CACHE", "1") != "0"
+CONTENT_CACHE_TTL = _env_int("CONTENT_CACHE_TTL", 900)
+CONTENT_CACHE_MAX_BYTES = _env_int("CONTENT_CACHE_MAX_BYTES", 50 * 1024 * 1024)
+
+_content_cache_conn = None
+_content_cache_lock = threading.RLock()
+_content_cache_stats = Counter(hits=0, misses=0, revalidated=0, evictions=0)
+
+# Article extraction: stop reading a page once SCRAPE_MAX_CHARS of paragraph
+# text are collected, and ignore paragraphs inside boilerplate containers.
+SCRAPE_MAX_CHARS = 3000
+SCRAPE_SKIP_TAGS = ("script", "style", "noscript", "nav", "header", "footer", "aside", "form")
+SCRAPE_LOG_SIZE = _env_int("SCRAPE_LOG_SIZE", 200)
+
+_scrape_stats = Counter(pages=0, bytes_read=0, parse_seconds=0.0, stopped_early=0)
+_scrape_log = deque(maxlen=SCRAPE_LOG_SIZE)
+
+# Sentiment scores, memoized by content hash. Batches of at least
+# SENTIMENT_PROCESS_MIN_BATCH uncached texts are spread over SENTIMENT_PROCESSES
+# worker processes (0 keeps scoring in-process).
+SENTIMENT_CACHE_SIZE = _env_int("SENTIMENT_CACHE_SIZE", 10000)
+SENTIMENT_PROCESSES = _env_int("SENTIMENT_PROCESSES", 0)
+SENTIMENT_PROCESS_MIN_BATCH = _env_int("SENTIMENT_PROCESS_MIN_BATCH", 32)
+SENTIMENT_SENTENCE_LEVEL = os.getenv("SENTIMENT_SENTENCE_LEVEL", "0") == "1"
+_SENTENCE_BOUNDARY = re.compile(r"(?<=[.!?])\s+")
+
+_sentiment_cache = OrderedDict()
+_sentiment_cache_lock = threading.Lock()
+_sentiment_pool = None
+_sentiment_stats = Counter(hits=0, misses=0)
+
+# Synthesized speech, cached as MP3 files named by a hash of the source text
+# and voice settings. Orphaned per-request files are cleaned up periodically.
+TTS_LANG = "hi"
+TTS_SLOW = False
+TTS_TLD = os.getenv("TTS_TLD", "com")
+TTS_CACHE_DIR = os.path.join(NEWS_CACHE_DIR, "tts")
+TTS_CACHE_MAX_BYTES = _env_int("TTS_CACHE_MAX_BYTES", 100 * 1024 * 1024)
+TTS_ORPHAN_MAX_AGE = _env_int("TTS_ORPHAN_MAX_AGE", 3600)
+TTS_CLEANUP_INTERVAL = _env_int("TTS_CLEANUP_INTERVAL", 600)
+TTS_MEMORY_CACHE_SIZE = _env_int("TTS_MEMORY_CACHE_SIZE", 64)
+
+_tts_memory_cache = OrderedDict()
+
+_tts_cache_lock = threading.Lock()
+_tts_last_cleanup = 0.0
+_tts_cache_stats = Counter(hits=0, misses=0, evictions=0)
+
+# Translations for TTS, memoized per sentence by source text and language in
+# memory and in SQLite. Uncached sentences are translated in one round-trip
+# that may take at most TRANSLATION_TIMEOUT seconds before the original text
+# is used instead.
+TRANSLATION_TIMEOUT = _env_float("TRANSLATION_TIMEOUT", 5.0)
+TRANSLATION_CACHE_SIZE = _env_int("TRANSLATION_CACHE_SIZE", 1024)
+TRANSLATION_CACHE_DISK_SIZE = _env_int("TRANSLATION_CACHE_DISK_SIZE", 20000)
+_TRANSLATION_SEPARATOR = "\n"
+
+_translation_memory_cache = OrderedDict()
+_translation_cache_conn = None
+_translation_cache_lock = threading.RLock()
+_translation_executor = None
+_translation_loop = None
+_translation_stats = Counter(hits=0, disk_hits=0, misses=0, round_trips=0, timeouts=0, failures=0)
+
+# Background jobs for slow requests. At most JOB_QUEUE_LIMIT jobs may be queued
+# or running; finished jobs are kept for JOB_RESULT_TTL seconds.
+JOB_WORKERS = max(1, _env_int("JOB_WORKERS", 4))
+JOB_QUEUE_LIMIT = max(1, _env_int("JOB_QUEUE_LIMIT", 32))
+JOB_RESULT_TTL = _env_int("JOB_RESULT_TTL", 600)
+
+_jobs = {}
+_jobs_in_flight = {}
+_jobs_lock = threading.Condition()
+_job_executor = None
+_job_stats = Counter(submitted=0, deduplicated=0, rejected=0)
+
+# Gemini responses, keyed by a hash of the model name and normalized prompt.
+# The in-memory LRU is always on; LLM_CACHE_DISK=1 adds a SQLite tier behind it.
+LLM_CACHE_ENABLED = os.getenv("LLM_CACHE", "1") != "0"
+LLM_CACHE_SIZE = _env_int("LLM_CACHE_SIZE", 1024)
+LLM_CACHE_TTL = _env_int("LLM_CACHE_TTL", 6 * 60 * 60)
+LLM_CACHE_DISK = os.getenv("LLM_CACHE_DISK", "0") == "1"
+LLM_CACHE_DISK_SIZE = _env_int("LLM_CACHE_DISK_SIZE", 20000)
+
+_llm_memory_cache = OrderedDict()
+_llm_cache_conn = None
+_llm_cache_lock = threading.RLock()
+_llm_cache_stats = Counter(hits=0, disk_hits=0, misses=0, stores=0, evictions=0, saved_seconds=0.0)
+
+# Historical store: every analysis is recorded in SQLite (articles with their
+# sentiment and topics, plus the comparative results) for trend queries.
+HISTORY_ENABLED = os.getenv("NEWS_HISTORY", "1") != "0"
+HISTORY_DB_PATH = os.getenv("HISTORY_DB_PATH", os.path.join(NEWS_CACHE_DIR, "history.sqlite3"))
+HISTORY_BUCKETS = {"hour": "%Y-%m-%d %H:00", "day": "%Y-%m-%d", "week": "%Y-W%W", "month": "%Y-%m"}
+
+_history_conn = None
+_history_lock = threading.RLock()
+_history_stats = Counter(articles_recorded=0, analyses_recorded=0, queries=0)
+
+# Gemini call scheduling: a token bucket (LLM_RATE calls per second, bursts of
+# LLM_BURST) and a concurrency limit that halves on every 429 and grows back
+# by one after LLM_CONCURRENCY_STEP successes. Waiting calls are served by
+# priority. Failed calls are retried with jittered exponential backoff, and
+# after LLM_BREAKER_THRESHOLD consecutive failures the breaker opens: for
+# LLM_BREAKER_COOLDOWN seconds calls fail fast and callers use their fallbacks.
+LLM_RATE = _env_float("LLM_RATE", 5.0)
+LLM_BURST = max(1, _env_int("LLM_BURST", 10))
+LLM_MAX_CONCURRENCY = max(1, _env_int("LLM_MAX_CONCURRENCY", NEWS_MAX_WORKERS))
+LLM_CONCURRENCY_STEP = max(1, _env_int("LLM_CONCURRENCY_STEP", 10))
+LLM_RETRIES = _env_int("LLM_RETRIES", 2)
+LLM_BACKOFF = _env_float("LLM_BACKOFF", 1.0)
+LLM_QUEUE_TIMEOUT = _env_float("LLM_QUEUE_TIMEOUT", 60.0)
+LLM_BREAKER_THRESHOLD = max(1, _env_int("LLM_BREAKER_THRESHOLD", 5))
+LLM_BREAKER_COOLDOWN = _env_float("LLM_BREAKER_COOLDOWN", 30.0)
+LLM_PRIORITIES = {"summary": 0, "topics": 1, "comparison": 2}
+
+_llm_scheduler = threading.Condition()
+_llm_waiting = []
+_llm_tickets = itertools.count()
+_llm_state = {
+    "tokens": float(LLM_BURST), "refilled_at": time.monotonic(), "in_flight": 0, "limit": LLM_MAX_CONCURRENCY,
+    "successes": 0, "failures": 0, "breaker": "closed", "opened_at": 0.0, "probing": False,
+}
+_llm_scheduler_stats = Counter(calls=0, retries=0, rate_limited=0, failures=0, rejected=0, breaker_opens=0)
+
+# Per-company refresh state: analyzed articles (by URL and publish time) and
+# Gemini comparisons (by URL pair) are remembered for COMPANY_STATE_TTL
+# seconds, so a refresh only analyzes and compares articles it has not seen.
+NEWS_INCREMENTAL = os.getenv("NEWS_INCREMENTAL", "1") != "0"
+COMPANY_STATE_TTL = _env_int("COMPANY_STATE_TTL", 7 * 24 * 60 * 60)
+_ARTICLE_REFERENCE = re.compile(r"\bArticle (\d+)\b")
+
+_company_state_conn = None
+_company_state_lock = threading.RLock()
+_company_state_stats = Counter(articles_reused=0, articles_analyzed=0, comparisons_reused=0, analyses_reused=0)
+
+
+def process_article(art, company_name, content=None):
+    """Scrape (unless content is given), summarize, tag and score a single NewsAPI article"""
+    return _process_article(art, company_name, content)[0]
+
+
+def _process_article(art, company_name, content=None):
+    """process_article, returning (article, fell_back) as _analyze_articles_batch does"""
+    if content is None:
+        with _stage("scrape"):
             content = scrape_article(art["url"])
-            summary = generate_summary(content, company_name)
-            topics = extract_topics(art["title"], content, company_name)
-            sentiment = analyze_sentiment(content)
-
-            processed_articles.append({
-                "Title": art["title"],
-                "url": art["url"],
-                "content": content,
-                "Summary": summary,
-                "Sentiment": sentiment,
-                "Topics": topics,
-                "source": art.get("source", {}).get("name", "Unknown Source")
-            })
+    with _stage("summary"):
+        summary, summary_fell_back = _generate_summary(content, company_name)
+    with _stage("topics"):
+        topics, topics_fell_back = _extract_topics(art["title"], content, company_name)
+    with _stage("sentiment"):
+        sentiment = analyze_sentiment(content)
+
+    return _build_article(art, content, summary, topics, sentiment), summary_fell_back or topics_fell_back
+
+
+def _build_article(art, content, summary, topics, sentiment):
+    """Assemble the per-article output record"""
+    return {
+        "Title": art["title"],
+        "url": art["url"],
+        "content": content,
+        "Summary": summary,
+        "Sentiment": sentiment,
+        "Topics": topics,
+        "source": art.get("source", {}).get("name", "Unknown Source")
+    }
+
+
+def _scrape_stage(art):
+    with _stage("scrape"):
+        return scrape_article(art["url"])
+
+
+def _shared_scrape_stage():
+    """Return a _scrape_stage replacement that scrapes each URL only once, however many threads ask for it"""
+    futures = {}
+    lock = threading.Lock()
+
+    def scrape(art):
+        with lock:
+            future = futures.get(art["url"])
+            owner = future is None
+            if owner:
+                future = futures[art["url"]] = Future()
+        if owner:
+            try:
+                future.set_result(_scrape_stage(art))
+            except Exception as e:
+                future.set_exception(e)
+        return future.result()
+
+    return scrape
+
+
+def iter_processed_articles(articles, company_name, contents=None, partial=False):
+    """Run the article pipeline over NewsAPI articles, yielding (index, article, fell_back) as each finishes
+
+    fell_back is True when Gemini could not be used for the article's summary
+    or topics, so the result should not be remembered for later refreshes.
+
+    In batch mode every article is scraped first and then summarized and
+    tagged together in a single Gemini call, so results arrive together. With
+    partial=True each article is also yielded as soon as it is scraped and
+    scored, as (index, article, None) with a None Summary and no Topics; the
+    complete article follows after the batch call. contents optionally holds
+    already scraped text per article (None entries are scraped).
+    """
+    contents = list(contents) if contents is not None else [None] * len(articles)
+    if NEWS_BATCH_ANALYSIS and len(articles) > 1:
+        if partial:
+            sentiments = [None] * len(articles)
+            for index, content in _iter_scraped(articles, contents):
+                contents[index] = content
+                with _stage("sentiment"):
+                    sentiments[index] = analyze_sentiment(content)
+                yield index, _build_article(articles[index], content, None, [], sentiments[index]), None
+        else:
+            missing = [index for index, content in enumerate(contents) if content is None]
+            for index, content in zip(missing, _map(_scrape_stage, [articles[index] for index in missing])):
+                contents[index] = content
+        with _stage("summary"), _stage("topics"):
+            analyses = _analyze_articles_batch(
+                [(art["title"], content) for art, content in zip(articles, contents)], company_name
+            )
+        if not partial:
+            with _stage("sentiment"):
+                sentiments = analyze_sentiments(contents)
+        for index, (art, content, (summary, topics, fell_back), sentiment) in enumerate(
+                zip(articles, contents, analyses, sentiments)):
+            yield index, _build_article(art, content, summary, topics, sentiment), fell_back
+        return
+
+    if not NEWS_CONCURRENT or len(articles) < 2:
+        for index, art in enumerate(articles):
+            yield (index,) + _process_article(art, company_name, contents[index])
+        return
+
+    futures = {_get_executor().submit(_with_context(_process_article), art, company_name, contents[index]): index
+               for index, art in enumerate(articles)}
+    for future in as_completed(futures):
+        yield (futures[future],) + future.result()
+
+
+def _iter_scraped(articles, contents):
+    """Yield (index, content) for every article as soon as its content is available
+
+    Entries of contents that are not None are yielded first; the rest are
+    scraped on the worker pool.
+    """
+    missing = []
+    for index, content in enumerate(contents):
+        if content is None:
+            missing.append(index)
+        else:
+            yield index, content
+    if not NEWS_CONCURRENT or len(missing) < 2:
+        for index in missing:
+            yield index, _scrape_stage(articles[index])
+        return
+
+    futures = {_get_executor().submit(_with_context(_scrape_stage), articles[index]): index for index in missing}
+    for future in as_completed(futures):
+        yield futures[future], future.result()
+
+
+@span("newsapi")
+def fetch_newsapi_articles(company_name):
+    """Return the raw NewsAPI article list for a company, or None if the request failed"""
+    api_key = os.getenv("NEWS_API_KEY")
+    url = NEWS_API_URL
+    params = {"q": company_name, "language": "en", "apiKey": api_key}
+
+    try:
+        response = http_get(url, params=params)
+    except requests.RequestException as e:
+        print(f"NewsAPI Error: {e}")
+        return None
+
+    if response.status_code != 200:
+        return None
+    return response.json().get("articles", [])
+
+
+def _simhash(features):
+    """64-bit SimHash of a collection of string features"""
+    weights = [0] * 64
+    for feature, count in Counter(features).items():
+        value = int.from_bytes(hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest(), "big")
+        for bit in range(64):
+            weights[bit] += count if value >> bit & 1 else -count
+    return sum(1 << bit for bit in range(64) if weights[bit] > 0)
+
+
+def title_fingerprint(title, source=None):
+    """SimHash of a headline's words and word pairs, or None if it has fewer than DEDUP_TITLE_MIN_TOKENS words
+
+    A trailing " - Publisher" (or " | ", " \u2013 ") suffix is ignored only when
+    it names source, the article's publisher.
+    """
+    title = (title or "").lower()
+    suffix = _TITLE_SOURCE_SUFFIX.search(title)
+    if suffix and source and _FINGERPRINT_TOKEN.findall(suffix.group(1)) == _FINGERPRINT_TOKEN.findall(source.lower()):
+        title = title[:suffix.start()]
+    tokens = _FINGERPRINT_TOKEN.findall(title)
+    if len(tokens) < max(DEDUP_TITLE_MIN_TOKENS, 1):
+        return None
+    return _simhash(tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])])
+
+
+def content_fingerprint(content):
+    """SimHash of an article body's word 3-shingles, or None if there is no usable text"""
+    if content == "Content unavailable":
+        return None
+    tokens = _FINGERPRINT_TOKEN.findall(content.lower())
+    if len(tokens) < 3:
+        return None
+    return _simhash([" ".join(tokens[k:k + 3]) for k in range(len(tokens) - 2)])
+
 
-        # Generate comparative analysis after processing all articles
+def _near_duplicate_of(fingerprint, kept, max_distance):
+    """Return the index of the first kept fingerprint within max_distance bits, or None"""
+    if fingerprint is None:
+        return None
+    for index, other in kept:
+        if other is not None and bin(fingerprint ^ other).count("1") <= max_distance:
+            return index
+    return None
+
+
+@span("dedup")
+def select_distinct_articles(articles, company_name, limit=None, scrape=_scrape_stage):
+    """Pick up to limit (NEWS_MAX_ARTICLES) NewsAPI articles that are not near-duplicates
+
+    Titles are compared first, over the whole result list, so syndicated copies
+    are dropped before anything is scraped. Candidates are then scraped a slot
+    at a time and compared by content; a duplicate frees its slot for the next
+    candidate. Articles already analyzed for the company (see
+    load_company_articles) are fingerprinted from their stored content instead
+    of being scraped again. scrape(article) returns an article's content.
+
+    Returns (articles, {index: content}, {index: known processed article}, stats).
+    """
+    limit = NEWS_MAX_ARTICLES if limit is None else limit
+    stats = {"Candidates": len(articles), "Title Duplicates": 0, "Content Duplicates": 0, "Backfilled": 0,
+             "Collapsed": []}
+
+    candidates = []
+    title_fingerprints = []
+    seen_urls = set()
+    for art in articles:
+        if art.get("url") in seen_urls:
+            continue
+        seen_urls.add(art.get("url"))
+        fingerprint = title_fingerprint(art.get("title"), (art.get("source") or {}).get("name"))
+        original = _near_duplicate_of(fingerprint, title_fingerprints, DEDUP_TITLE_DISTANCE)
+        if original is not None:
+            stats["Title Duplicates"] += 1
+            stats["Collapsed"].append({"url": art["url"], "Duplicate Of": candidates[original]["url"]})
+            continue
+        title_fingerprints.append((len(candidates), fingerprint))
+        candidates.append(art)
+
+    known_by_url = {}
+    if NEWS_INCREMENTAL:
+        known_by_url = {candidates[index]["url"]: article
+                        for index, article in load_company_articles(company_name, candidates).items()}
+
+    selected, contents, known = [], {}, {}
+    content_fingerprints = []
+    position = 0
+    while len(selected) < limit and position < len(candidates):
+        wave = candidates[position:position + limit - len(selected)]
+        position += len(wave)
+        to_scrape = [art for art in wave if art["url"] not in known_by_url]
+        scraped = dict(zip((art["url"] for art in to_scrape), _map(scrape, to_scrape)))
+
+        for art in wave:
+            article = known_by_url.get(art["url"])
+            content = article["content"] if article is not None else scraped[art["url"]]
+            fingerprint = content_fingerprint(content)
+            original = _near_duplicate_of(fingerprint, content_fingerprints, DEDUP_CONTENT_DISTANCE)
+            if original is not None:
+                stats["Content Duplicates"] += 1
+                stats["Collapsed"].append({"url": art["url"], "Duplicate Of": selected[original]["url"]})
+                continue
+            index = len(selected)
+            content_fingerprints.append((index, fingerprint))
+            selected.append(art)
+            contents[index] = content
+            if article is not None:
+                known[index] = article
+
+    # Slots that went to articles beyond the first `limit` NewsAPI results
+    original_positions = {id(art): position for position, art in enumerate(articles)}
+    stats["Backfilled"] = sum(1 for art in selected if original_positions[id(art)] >= limit)
+    _bump(_dedup_stats, "candidates", stats["Candidates"])
+    _bump(_dedup_stats, "title_duplicates", stats["Title Duplicates"])
+    _bump(_dedup_stats, "content_duplicates", stats["Content Duplicates"])
+    return selected, contents, known, stats
+
+
+def get_dedup_stats():
+    """Return near-duplicate detection counters"""
+    with _stats_lock:
+        return dict(_dedup_stats)
+
+
+def iter_news(company_name):
+    """Fetch and analyze news for a company, yielding progress events
+
+    Events are dicts with an "event" key:
+      "start"    - {"Company", "count", "Deduplication"}: number of articles being
+                   processed and how many near-duplicates were collapsed
+      "article"  - {"index", "article", "partial"}: one processed article, as soon
+                   as it is ready. In batch mode (NEWS_BATCH_ANALYSIS) each new
+                   article is first sent with "partial": True as soon as it is
+                   scraped and scored (Summary None, Topics empty), and again
+                   complete once the single batch Gemini call returns
+      "analysis" - {"Comparative Sentiment Score"}: always the final event
+    """
+    articles = fetch_newsapi_articles(company_name)
+    if articles is None:
+        yield {"event": "start", "Company": company_name, "count": 0}
+        yield {"event": "analysis", "Comparative Sentiment Score": {}}
+        return
+
+    articles, contents, processed, dedup_stats = select_company_articles(articles, company_name)
+    yield {"event": "start", "Company": company_name, "count": len(articles), "Deduplication": dedup_stats}
+
+    for index in sorted(processed):
+        yield {"event": "article", "index": index, "article": processed[index], "partial": False}
+
+    new_indices = [index for index in range(len(articles)) if index not in processed]
+    fell_back = set()
+    for position, article, article_fell_back in iter_processed_articles(
+            [articles[index] for index in new_indices], company_name, [contents.get(index) for index in new_indices],
+            partial=True):
+        if article_fell_back is None:
+            yield {"event": "article", "index": new_indices[position], "article": article, "partial": True}
+            continue
+        processed[new_indices[position]] = article
+        if article_fell_back:
+            fell_back.add(new_indices[position])
+        yield {"event": "article", "index": new_indices[position], "article": article, "partial": False}
+
+    # Generate comparative analysis after processing all articles
+    comparative_analysis = finish_company_analysis(company_name, articles, processed, new_indices, fell_back)
+    yield {"event": "analysis", "Comparative Sentiment Score": comparative_analysis}
+
+
+def select_company_articles(articles, company_name, scrape=_scrape_stage):
+    """Choose the NewsAPI articles to analyze for a company
+
+    Limits them to NEWS_MAX_ARTICLES (4 by default) distinct stories and looks
+    up the ones analyzed on an earlier refresh, so only new ones are processed.
+    Returns (articles, {index: content}, {index: known processed article},
+    deduplication stats or None), as select_distinct_articles does, which
+    scrapes with scrape.
+    """
+    if NEWS_DEDUP:
+        return select_distinct_articles(articles, company_name, scrape=scrape)
+    articles = articles[:NEWS_MAX_ARTICLES]
+    known = load_company_articles(company_name, articles) if NEWS_INCREMENTAL else {}
+    return articles, {}, known, None
+
+
+def finish_company_analysis(company_name, articles, processed, new_indices, fell_back=()):
+    """Remember newly processed articles and return the company's comparative analysis
+
+    processed maps every index of articles to its processed article;
+    new_indices are the ones analyzed by this request, and fell_back those of
+    them whose summary or topics are fallbacks (they are not remembered).
+    """
+    processed_articles = [processed[index] for index in range(len(articles))]
+    if NEWS_INCREMENTAL:
+        save_company_articles(company_name, [(articles[index], processed[index])
+                                             for index in new_indices if index not in fell_back])
+        # Analyzed all the same, just not remembered
+        _bump(_company_state_stats, "articles_analyzed", len(fell_back))
+        comparative_analysis = update_comparative_analysis(processed_articles, company_name,
+                                                           reanalyzed=bool(new_indices))
+    else:
         comparative_analysis = generate_comparative_analysis(processed_articles, company_name)
+    if HISTORY_ENABLED:
+        record_history(company_name, articles, processed_articles, comparative_analysis)
+    return comparative_analysis
+
+
+def fetch_news(company_name, on_event=None):
+    """Fetch news articles from NewsAPI
+
+    on_event, if given, is called with every progress event from iter_news.
+    """
+    processed = {}
+    comparative_analysis = {}
+    dedup_stats = None
+    for event in iter_news(company_name):
+        if on_event is not None:
+            on_event(event)
+        if event["event"] == "start":
+            dedup_stats = event.get("Deduplication")
+        elif event["event"] == "article" and not event.get("partial"):
+            processed[event["index"]] = event["article"]
+        elif event["event"] == "analysis":
+            comparative_analysis = event["Comparative Sentiment Score"]
+
+    # Format the output according to the requested structure
+    formatted_output = {
+        "Company": company_name,
+        "Articles": [processed[index] for index in sorted(processed)],
+        "Comparative Sentiment Score": comparative_analysis
+    }
+    if dedup_stats is not None:
+        formatted_output["Deduplication"] = dedup_stats
+
+    return formatted_output
+
 
-        # Format the output according to the requested structure
+def fetch_news_batch(company_names):
+    """Fetch and analyze news for several companies, returning one formatted_output per company
+
+    Each company's articles are chosen as for /news (deduplication and
+    incremental refresh included) and all companies share the worker pool and
+    stage limits. An article returned for more than one company is scraped
+    and analyzed only once, on behalf of the first company it was found for;
+    new articles are analyzed in batches of up to NEWS_MAX_ARTICLES per company.
+    """
+    companies = []
+    seen = set()
+    for name in company_names:
+        key = " ".join(name.lower().split())
+        if key and key not in seen:
+            seen.add(key)
+            companies.append(name.strip())
+
+    # Deduplication scrapes articles per company; a URL several companies share is scraped once
+    scrape = _shared_scrape_stage()
+
+    def select(item):
+        company, articles = item
+        return None if articles is None else select_company_articles(articles, company, scrape)
+
+    selections = _batch_map(select, zip(companies, _batch_map(fetch_newsapi_articles, companies)))
+
+    # Every distinct URL that still has to be analyzed, under the first company it was found for
+    pending = {}
+    for company, selection in zip(companies, selections):
+        if selection is None:
+            continue
+        articles, contents, known, _ = selection
+        for index, art in enumerate(articles):
+            if index not in known and art["url"] not in pending:
+                pending[art["url"]] = (company, art, contents.get(index))
+
+    groups = {}
+    for company, art, content in pending.values():
+        groups.setdefault(company, []).append((art, content))
+    chunks = [(company, items[offset:offset + NEWS_MAX_ARTICLES])
+              for company, items in groups.items() for offset in range(0, len(items), NEWS_MAX_ARTICLES)]
+
+    def analyze_chunk(item):
+        company, items = item
+        articles = [art for art, _ in items]
+        return [(articles[index]["url"], (article, fell_back)) for index, article, fell_back
+                in iter_processed_articles(articles, company, [content for _, content in items])]
+
+    processed_by_url = {}
+    for results in _batch_map(analyze_chunk, chunks):
+        processed_by_url.update(results)
+
+    def compare(item):
+        company, selection = item
+        if selection is None:
+            return {"Company": company, "Articles": [], "Comparative Sentiment Score": {}}
+        articles, _, known, dedup_stats = selection
+        processed = {index: known[index] if index in known else dict(processed_by_url[art["url"]][0])
+                     for index, art in enumerate(articles)}
+        new_indices = [index for index in range(len(articles)) if index not in known]
+        fell_back = {index for index in new_indices if processed_by_url[articles[index]["url"]][1]}
         formatted_output = {
-            "Company": company_name,
-            "Articles": processed_articles,
-            "Comparative Sentiment Score": comparative_analysis
+            "Company": company,
+            "Articles": [processed[index] for index in range(len(articles))],
+            "Comparative Sentiment Score": finish_company_analysis(company, articles, processed, new_indices,
+                                                                   fell_back)
         }
-
+        if dedup_stats is not None:
+            formatted_output["Deduplication"] = dedup_stats
         return formatted_output
-    else:
-        return {"Company": company_name, "Articles": [], "Comparative Sentiment Score": {}}
 
+    outputs = _batch_map(compare, zip(companies, selections))
+
+    selected = [selection[0] for selection in selections if selection is not None]
+    _bump(_batch_stats, "batches")
+    _bump(_batch_stats, "companies", len(companies))
+    _bump(_batch_stats, "articles", sum(len(articles) for articles in selected))
+    _bump(_batch_stats, "unique_articles", len({art["url"] for articles in selected for art in articles}))
+    _bump(_batch_stats, "analyzed_articles", len(pending))
+    return outputs
+
+
+def get_batch_stats():
+    """Return multi-company batch counters (articles, distinct articles and articles actually analyzed)"""
+    with _stats_lock:
+        return dict(_batch_stats)
+
+
+@span("comparative_analysis")
+def generate_comparative_analysis(articles, company_name, known_comparisons=None):
+    """Generate comparative analysis of news coverage
 
-def generate_comparative_analysis(articles, company_name):
-    """Generate comparative analysis of news coverage"""
+    known_comparisons optionally maps (i, j) article index pairs to already
+    generated (comparison, impact) texts; see generate_detailed_comparisons.
+    """
     if not articles or len(articles) < 2:
         return {"error": "Not enough articles for comparative analysis"}
 
@@ -83,7 +1204,7 @@ def generate_comparative_analysis(articles, company_name):
     sentiment_distribution = {k: v for k, v in sentiment_counts.items()}
 
     # Generate detailed comparison between articles
-    coverage_differences = generate_detailed_comparisons(articles)
+    coverage_differences = generate_detailed_comparisons(articles, known_comparisons)
 
     # Find topic overlaps
     topic_overlap = calculate_topic_overlap(articles)
@@ -102,82 +1223,154 @@ def generate_comparative_analysis(articles, company_name):
     return analysis
 
 
-def generate_detailed_comparisons(articles):
-    """Generate detailed comparisons between each pair of articles"""
+def _fallback_comparison(i, j, article1, article2):
+    """Build a rule-based comparison entry for articles i and j (0-based)"""
+    return {
+        "Comparison": f"Article {i + 1} focuses on {article1['Topics'][0] if article1['Topics'] else 'general news'}, while Article {j + 1} covers {article2['Topics'][0] if article2['Topics'] else 'other aspects'}.",
+        "Impact": f"Article {i + 1} presents a {article1['Sentiment'].lower()} view that might {get_impact_by_sentiment(article1['Sentiment'])}, while Article {j + 1}'s {article2['Sentiment'].lower()} angle could {get_impact_by_sentiment(article2['Sentiment'])}.",
+        "Articles": f"{i + 1} and {j + 1}"
+    }
+
+
+def _comparison_groups(articles):
+    """Split article indices into groups that are each compared in one Gemini call
+
+    Beyond one group, articles are ordered by primary topic and sentiment first
+    so that similar coverage ends up being compared side by side.
+    """
+    indices = list(range(len(articles)))
+    if len(indices) > COMPARISON_GROUP_SIZE:
+        indices.sort(key=lambda i: (articles[i]["Topics"][0] if articles[i]["Topics"] else "",
+                                    articles[i]["Sentiment"], i))
+
+    groups = [sorted(indices[k:k + COMPARISON_GROUP_SIZE])
+              for k in range(0, len(indices), COMPARISON_GROUP_SIZE)]
+    # A lone trailing article has nothing to be compared with; fold it into the previous group
+    if len(groups) > 1 and len(groups[-1]) == 1:
+        groups[-2] = sorted(groups[-2] + groups.pop())
+    return groups
+
+
+def _strip_code_fence(text):
+    """Remove a surrounding ```json fence that Gemini sometimes adds"""
+    text = text.strip()
+    if text.startswith("```"):
+        text = text.strip("`")
+        if text.lower().startswith("json"):
+            text = text[4:]
+    return text
+
+
+def _parse_group_comparisons(text, pairs):
+    """Parse a group comparison response into {(i, j): (comparison, impact)}"""
+    try:
+        items = json.loads(_strip_code_fence(text))
+    except ValueError:
+        return None
+    if not isinstance(items, list):
+        return None
+
+    labels = {f"{i + 1} and {j + 1}": (i, j) for i, j in pairs}
+    results = {}
+    for item in items:
+        if not isinstance(item, dict):
+            continue
+        pair = labels.get(str(item.get("articles", "")).strip())
+        comparison = item.get("comparison")
+        impact = item.get("impact")
+        if pair and isinstance(comparison, str) and isinstance(impact, str) and comparison.strip() and impact.strip():
+            results[pair] = (comparison.strip(), impact.strip())
+
+    return results or None
+
+
+@span("comparison_group")
+def _compare_group(articles, group):
+    """Compare every pair of articles in one group with a single Gemini call"""
+    pairs = [(i, j) for k, i in enumerate(group) for j in group[k + 1:]]
+
+    sections = []
+    for i in group:
+        article = articles[i]
+        sections.append(f"""
+        ARTICLE {i + 1}:
+        Title: {article['Title']}
+        Summary: {article['Summary']}
+        Sentiment: {article['Sentiment']}
+        Topics: {', '.join(article['Topics'])}
+        """)
+
+    prompt = f"""
+    Create detailed comparisons between these news articles about the same company:
+    {"".join(sections)}
+    For each of these article pairs: {", ".join(f"{i + 1} and {j + 1}" for i, j in pairs)}
+    provide TWO detailed comparison aspects:
+
+    1. A clear comparison of the content focus and angle between the two articles
+    2. An analysis of the potential market/business impact these different perspectives might have
+
+    Respond with ONLY a JSON array containing one object per pair, like:
+    [{{"articles": "1 and 2", "comparison": "Article 1 highlights Tesla's strong sales, while Article 2 discusses regulatory issues.", "impact": "The first article boosts confidence in Tesla's market growth, while the second raises concerns about future regulatory hurdles."}}]
+    """
+
+    try:
+        parsed = generate_cached(
+            prompt,
+            lambda text: _parse_group_comparisons(text, pairs),
+            cacheable=lambda results: len(results) == len(pairs),
+            priority="comparison"
+        ) or {}
+    except Exception as e:
+        print(f"Detailed Comparison Error: {e}")
+        parsed = {}
+
     comparisons = []
+    for i, j in pairs:
+        if (i, j) in parsed:
+            comparison, impact = parsed[(i, j)]
+            comparisons.append({
+                "Comparison": comparison,
+                "Impact": impact,
+                "Articles": f"{i + 1} and {j + 1}"  # Include article numbers for reference
+            })
+        else:
+            comparisons.append(_fallback_comparison(i, j, articles[i], articles[j]))
+    return comparisons
 
-    # Compare each pair of articles for a more comprehensive analysis
-    for i in range(len(articles)):
-        for j in range(i + 1, len(articles)):
-            article1 = articles[i]
-            article2 = articles[j]
 
-            try:
-                # Use Gemini to generate detailed comparisons
-                prompt = f"""
-                Create a detailed comparison between these two news articles about the same company:
-
-                ARTICLE {i + 1}:
-                Title: {article1['Title']}
-                Summary: {article1['Summary']}
-                Sentiment: {article1['Sentiment']}
-                Topics: {', '.join(article1['Topics'])}
-
-                ARTICLE {j + 1}:
-                Title: {article2['Title']}
-                Summary: {article2['Summary']}
-                Sentiment: {article2['Sentiment']}
-                Topics: {', '.join(article2['Topics'])}
-
-                Please provide TWO detailed comparison aspects:
-
-                1. A clear comparison of the content focus and angle between these articles
-                2. An analysis of the potential market/business impact these different perspectives might have
-
-                Format exactly like this example:
-                "Comparison": "Article 1 highlights Tesla's strong sales, while Article 2 discusses regulatory issues.",
-                "Impact": "The first article boosts confidence in Tesla's market growth, while the second raises concerns about future regulatory hurdles."
-
-                Do not include labels like "1." or "Comparison:" in your response text itself.
-                Just provide the comparative text directly.
-                """
-
-                response = model.generate_content(prompt)
-                content = response.text.strip()
-
-                # Parse the response to extract comparison and impact
-                parts = content.split('\n')
-
-                comparison = ""
-                impact = ""
-
-                for part in parts:
-                    if part.strip().startswith('"Comparison":'):
-                        comparison = part.split(':', 1)[1].strip().strip('"').strip(',').strip('"').strip()
-                    elif part.strip().startswith('"Impact":'):
-                        impact = part.split(':', 1)[1].strip().strip('"').strip(',').strip('"').strip()
-
-                # If parsing failed, use a fallback method
-                if not comparison or not impact:
-                    # Simple fallback
-                    comparison = f"Article {i + 1} focuses on {article1['Topics'][0] if article1['Topics'] else 'general news'}, while Article {j + 1} covers {article2['Topics'][0] if article2['Topics'] else 'other aspects'}."
-                    impact = f"Article {i + 1} presents a {article1['Sentiment'].lower()} view that might {get_impact_by_sentiment(article1['Sentiment'])}, while Article {j + 1}'s {article2['Sentiment'].lower()} angle could {get_impact_by_sentiment(article2['Sentiment'])}."
-
-                comparisons.append({
-                    "Comparison": comparison,
-                    "Impact": impact,
-                    "Articles": f"{i + 1} and {j + 1}"  # Include article numbers for reference
-                })
+def generate_detailed_comparisons(articles, known_comparisons=None):
+    """Generate detailed comparisons between articles
 
-            except Exception as e:
-                print(f"Detailed Comparison Error: {e}")
-                fallback_comparison = {
-                    "Comparison": f"Article {i + 1} focuses on {article1['Topics'][0] if article1['Topics'] else 'general news'}, while Article {j + 1} covers {article2['Topics'][0] if article2['Topics'] else 'other aspects'}.",
-                    "Impact": f"Article {i + 1} presents a {article1['Sentiment'].lower()} view that might {get_impact_by_sentiment(article1['Sentiment'])}, while Article {j + 1}'s {article2['Sentiment'].lower()} angle could {get_impact_by_sentiment(article2['Sentiment'])}.",
-                    "Articles": f"{i + 1} and {j + 1}"
-                }
-                comparisons.append(fallback_comparison)
+    Articles are split into groups of COMPARISON_GROUP_SIZE and every pair
+    within a group is compared in one Gemini call, so the number of calls grows
+    linearly with the number of articles. At most COMPARISON_MAX_LLM_CALLS
+    groups go to Gemini; the rest use rule-based comparisons. Groups whose
+    pairs are all in known_comparisons ({(i, j): (comparison, impact)}) are
+    reused without a call.
+    """
+    known_comparisons = known_comparisons or {}
+    groups = _comparison_groups(articles)
 
+    comparisons = []
+    pending = []
+    for group in groups:
+        pairs = [(i, j) for k, i in enumerate(group) for j in group[k + 1:]]
+        if all(pair in known_comparisons for pair in pairs):
+            comparisons.extend({"Comparison": known_comparisons[(i, j)][0], "Impact": known_comparisons[(i, j)][1],
+                                "Articles": f"{i + 1} and {j + 1}"} for i, j in pairs)
+        else:
+            pending.append(group)
+
+    llm_groups = pending[:max(0, COMPARISON_MAX_LLM_CALLS)]
+    for group_comparisons in _map(lambda group: _compare_group(articles, group), llm_groups):
+        comparisons.extend(group_comparisons)
+    for group in pending[len(llm_groups):]:
+        comparisons.extend(
+            _fallback_comparison(i, j, articles[i], articles[j])
+            for k, i in enumerate(group) for j in group[k + 1:]
+        )
+
+    comparisons.sort(key=lambda entry: tuple(int(n) for n in entry["Articles"].split(" and ")))
     return comparisons
 
 
@@ -254,22 +1447,977 @@ def determine_final_sentiment(sentiment_counts, company_name):
     return f"{company_name}'s latest news coverage is {overall}. {impact}."
 
 
-def scrape_article(url):
-    """Scrape news article content using BeautifulSoup"""
+def _company_state_db():
+    """Return the (lazily opened) per-company refresh state"""
+    global _company_state_conn
+    if _company_state_conn is None:
+        with _company_state_lock:
+            if _company_state_conn is None:
+                _company_state_conn = _open_cache_db("company_state.sqlite3", """
+                    CREATE TABLE IF NOT EXISTS articles (
+                        company TEXT NOT NULL,
+                        url TEXT NOT NULL,
+                        published_at TEXT NOT NULL,
+                        article TEXT NOT NULL,
+                        analyzed_at REAL NOT NULL,
+                        PRIMARY KEY (company, url)
+                    );
+                    CREATE TABLE IF NOT EXISTS comparisons (
+                        company TEXT NOT NULL,
+                        url_a TEXT NOT NULL,
+                        url_b TEXT NOT NULL,
+                        comparison TEXT NOT NULL,
+                        impact TEXT NOT NULL,
+                        created_at REAL NOT NULL,
+                        PRIMARY KEY (company, url_a, url_b)
+                    );
+                    CREATE TABLE IF NOT EXISTS analyses (
+                        company TEXT PRIMARY KEY,
+                        urls TEXT NOT NULL,
+                        analysis TEXT NOT NULL,
+                        created_at REAL NOT NULL
+                    );
+                """)
+    return _company_state_conn
+
+
+def _company_key(company_name):
+    return " ".join(company_name.lower().split())
+
+
+def load_company_articles(company_name, articles):
+    """Return {index: processed article} for NewsAPI articles analyzed on an earlier refresh
+
+    An article counts as known when its URL was analyzed for this company and
+    its publishedAt timestamp has not changed since.
+    """
+    if not articles:
+        return {}
+    conn = _company_state_db()
+    with _company_state_lock:
+        rows = conn.execute(
+            f"SELECT url, published_at, article FROM articles WHERE company = ? AND analyzed_at >= ? "
+            f"AND url IN ({', '.join('?' * len(articles))})",
+            [_company_key(company_name), time.time() - COMPANY_STATE_TTL] + [art["url"] for art in articles]
+        ).fetchall()
+    known = {url: (published_at, article) for url, published_at, article in rows}
+
+    reused = {}
+    for index, art in enumerate(articles):
+        entry = known.get(art["url"])
+        if entry is not None and entry[0] == (art.get("publishedAt") or ""):
+            reused[index] = json.loads(entry[1])
+    _bump(_company_state_stats, "articles_reused", len(reused))
+    return reused
+
+
+def save_company_articles(company_name, items):
+    """Remember newly processed articles, given as (NewsAPI article, processed article) pairs
+
+    Articles whose content could not be scraped are not remembered, so the
+    next refresh tries them again; callers also leave out articles whose
+    summary or topics fell back (see iter_processed_articles).
+    """
+    rows = [(_company_key(company_name), art["url"], art.get("publishedAt") or "", json.dumps(article), time.time())
+            for art, article in items if article["content"] != "Content unavailable"]
+    _bump(_company_state_stats, "articles_analyzed", len(items))
+    if not rows:
+        return
+    conn = _company_state_db()
+    with _company_state_lock:
+        conn.executemany(
+            "INSERT OR REPLACE INTO articles (company, url, published_at, article, analyzed_at) "
+            "VALUES (?, ?, ?, ?, ?)", rows
+        )
+        conn.commit()
+
+
+def _comparison_template(text, number_a, number_b):
+    """Replace the article numbers in a comparison text with {a} / {b} placeholders"""
+    numbers = {number_a: "{a}", number_b: "{b}"}
+    text = text.replace("{", "{{").replace("}", "}}")
+    return _ARTICLE_REFERENCE.sub(lambda m: f"Article {numbers.get(int(m.group(1)), m.group(1))}", text)
+
+
+def update_comparative_analysis(articles, company_name, reanalyzed=False):
+    """Comparative analysis for a refreshed article list, reusing earlier results
+
+    If the articles are the same as last time and none of them was analyzed
+    again (reanalyzed, e.g. a page that could not be scraped before), the
+    stored analysis is returned. Otherwise Gemini comparisons stored for pairs
+    of articles that are still present are renumbered and reused, so only
+    groups containing new articles are sent to Gemini. Sentiment distribution,
+    topic overlap and the final sentiment are rule-based and recomputed for the
+    new list.
+    """
+    key = _company_key(company_name)
+    urls = [article["url"] for article in articles]
+    cutoff = time.time() - COMPANY_STATE_TTL
+    conn = _company_state_db()
+    with _company_state_lock:
+        row = conn.execute("SELECT urls, analysis FROM analyses WHERE company = ? AND created_at >= ?",
+                           (key, cutoff)).fetchone()
+        if not reanalyzed and row is not None and json.loads(row[0]) == urls:
+            _bump(_company_state_stats, "analyses_reused")
+            return json.loads(row[1])
+        stored = conn.execute(
+            "SELECT url_a, url_b, comparison, impact FROM comparisons WHERE company = ? AND created_at >= ?",
+            (key, cutoff)
+        ).fetchall()
+
+    positions = {url: index for index, url in enumerate(urls)}
+    known = {}
+    for url_a, url_b, comparison, impact in stored:
+        if url_a in positions and url_b in positions:
+            i, j = positions[url_a], positions[url_b]
+            numbers = {"a": i + 1, "b": j + 1}
+            known[(min(i, j), max(i, j))] = (comparison.format(**numbers), impact.format(**numbers))
+
+    _bump(_company_state_stats, "comparisons_reused", len(known))
+    analysis = generate_comparative_analysis(articles, company_name, known)
+
+    # Remember Gemini comparisons (not rule-based fallbacks, nor ones made
+    # without an article's content) by URL pair
+    now = time.time()
+    coverage_differences = analysis.get("Coverage Differences", [])
+    unavailable = {index for index, article in enumerate(articles) if article["content"] == "Content unavailable"}
+    rows = []
+    for entry in coverage_differences:
+        i, j = (int(n) - 1 for n in entry["Articles"].split(" and "))
+        if i in unavailable or j in unavailable or entry == _fallback_comparison(i, j, articles[i], articles[j]):
+            continue
+        rows.append((key, urls[i], urls[j], _comparison_template(entry["Comparison"], i + 1, j + 1),
+                     _comparison_template(entry["Impact"], i + 1, j + 1), now))
+    with _company_state_lock:
+        conn.execute("DELETE FROM comparisons WHERE company = ? AND created_at < ?", (key, cutoff))
+        conn.execute("DELETE FROM articles WHERE company = ? AND analyzed_at < ?", (key, cutoff))
+        conn.executemany(
+            "INSERT OR REPLACE INTO comparisons (company, url_a, url_b, comparison, impact, created_at) "
+            "VALUES (?, ?, ?, ?, ?, ?)", rows
+        )
+        # An analysis that had to fall back or lacked an article's content is not
+        # stored, so the next refresh retries it
+        if len(rows) == len(coverage_differences) and not unavailable:
+            conn.execute("INSERT OR REPLACE INTO analyses (company, urls, analysis, created_at) VALUES (?, ?, ?, ?)",
+                         (key, json.dumps(urls), json.dumps(analysis), now))
+        conn.commit()
+    return analysis
+
+
+def reset_company_state(company_name=None):
+    """Forget what was analyzed for one company (or all of them when company_name is None)"""
+    conn = _company_state_db()
+    with _company_state_lock:
+        for table in ("articles", "comparisons", "analyses"):
+            if company_name is None:
+                conn.execute(f"DELETE FROM {table}")
+            else:
+                conn.execute(f"DELETE FROM {table} WHERE company = ?", (_company_key(company_name),))
+        conn.commit()
+
+
+def get_company_state_stats():
+    """Return incremental refresh counters"""
+    with _stats_lock:
+        return dict(_company_state_stats)
+
+
+def _history_db():
+    """Return the (lazily opened) historical analysis store"""
+    global _history_conn
+    if _history_conn is None:
+        with _history_lock:
+            if _history_conn is None:
+                _history_conn = _open_sqlite(HISTORY_DB_PATH, """
+                    CREATE TABLE IF NOT EXISTS articles (
+                        company TEXT NOT NULL,
+                        url TEXT NOT NULL,
+                        title TEXT NOT NULL,
+                        source TEXT,
+                        published_at TEXT NOT NULL,
+                        sentiment TEXT NOT NULL,
+                        summary TEXT,
+                        recorded_at REAL NOT NULL,
+                        PRIMARY KEY (company, url)
+                    );
+                    CREATE INDEX IF NOT EXISTS articles_company_published
+                        ON articles (company, published_at, sentiment);
+                    CREATE TABLE IF NOT EXISTS article_topics (
+                        company TEXT NOT NULL,
+                        url TEXT NOT NULL,
+                        topic TEXT NOT NULL,
+                        published_at TEXT NOT NULL,
+                        PRIMARY KEY (company, url, topic)
+                    );
+                    CREATE INDEX IF NOT EXISTS article_topics_company_published
+                        ON article_topics (company, published_at, topic);
+                    CREATE INDEX IF NOT EXISTS article_topics_topic_published
+                        ON article_topics (topic, published_at, company);
+                    CREATE TABLE IF NOT EXISTS analyses (
+                        company TEXT NOT NULL,
+                        display_name TEXT NOT NULL,
+                        recorded_at TEXT NOT NULL,
+                        article_count INTEGER NOT NULL,
+                        final_sentiment TEXT,
+                        analysis TEXT NOT NULL
+                    );
+                    CREATE INDEX IF NOT EXISTS analyses_company_recorded ON analyses (company, recorded_at);
+                """)
+    return _history_conn
+
+
+def _history_timestamp(value=None):
+    """Normalize a NewsAPI publishedAt (or now) to a sortable UTC 'YYYY-MM-DD HH:MM:SS' string"""
+    if value:
+        try:
+            parsed = datetime.fromisoformat(value.replace("Z", "+00:00"))
+            if parsed.tzinfo is not None:
+                parsed = parsed.astimezone(timezone.utc)
+            return parsed.strftime("%Y-%m-%d %H:%M:%S")
+        except ValueError:
+            pass
+    return datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
+
+
+def record_history(company_name, raw_articles, articles, comparative_analysis):
+    """Store one analysis: the processed articles (by publish date) and its comparative results
+
+    raw_articles are the NewsAPI records the processed articles came from, in
+    the same order. Re-recorded articles are updated in place; a comparative
+    analysis identical to the company's latest one is not stored again.
+    """
+    key = _company_key(company_name)
+    now = time.time()
+    article_rows = []
+    topic_rows = []
+    for raw, article in zip(raw_articles, articles):
+        published_at = _history_timestamp(raw.get("publishedAt"))
+        article_rows.append((key, article["url"], article["Title"], article.get("source"), published_at,
+                             article["Sentiment"], article.get("Summary"), now))
+        topic_rows.extend((key, article["url"], topic, published_at) for topic in dict.fromkeys(article["Topics"]))
+    analysis = json.dumps(comparative_analysis, sort_keys=True)
+
+    try:
+        conn = _history_db()
+        with _history_lock:
+            conn.executemany("INSERT OR REPLACE INTO articles VALUES (?, ?, ?, ?, ?, ?, ?, ?)", article_rows)
+            for _, url, _, _, _, _, _, _ in article_rows:
+                conn.execute("DELETE FROM article_topics WHERE company = ? AND url = ?", (key, url))
+            conn.executemany("INSERT OR REPLACE INTO article_topics VALUES (?, ?, ?, ?)", topic_rows)
+            latest = conn.execute(
+                "SELECT analysis FROM analyses WHERE company = ? ORDER BY recorded_at DESC LIMIT 1", (key,)
+            ).fetchone()
+            stored_analysis = (comparative_analysis and "error" not in comparative_analysis
+                               and (latest is None or latest[0] != analysis))
+            if stored_analysis:
+                conn.execute("INSERT INTO analyses VALUES (?, ?, ?, ?, ?, ?)",
+                             (key, company_name, _history_timestamp(), len(articles),
+                              comparative_analysis.get("Final Sentiment Analysis"), analysis))
+            conn.commit()
+    except sqlite3.Error as e:
+        print(f"History Error: {e}")
+        return
+    _bump(_history_stats, "articles_recorded", len(article_rows))
+    _bump(_history_stats, "analyses_recorded", int(bool(stored_analysis)))
+
+
+def _history_bound(value, end_of_day=False):
+    """Normalize an ISO date or timestamp query bound; a date-only bound may mean the end of that day"""
+    parsed = datetime.fromisoformat(value.strip().replace("Z", "+00:00"))
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc)
+    if end_of_day and len(value.strip()) == 10:
+        parsed = parsed.replace(hour=23, minute=59, second=59)
+    return parsed.strftime("%Y-%m-%d %H:%M:%S")
+
+
+def history_range(since=None, until=None):
+    """Inclusive SQL bounds on publish date for since/until; open ends become the widest strings
+
+    A date-only until covers that whole day. Raises ValueError when either
+    bound is not an ISO date or timestamp.
+    """
+    low = _history_bound(since) if since else "0000"
+    high = _history_bound(until, end_of_day=True) if until else "9999"
+    return low, high
+
+
+def sentiment_history(company_name, bucket="day", since=None, until=None):
+    """Sentiment distribution of a company's recorded articles per time bucket
+
+    bucket is one of HISTORY_BUCKETS; since/until are ISO dates or timestamps
+    bounding the publish date (see history_range). Returns [{"bucket", "Positive", "Negative",
+    "Neutral", "total"}] in chronological order.
+    """
+    low, high = history_range(since, until)
+    _bump(_history_stats, "queries")
+    with _history_lock:
+        rows = _history_db().execute(
+            "SELECT strftime(?, published_at) AS period, sentiment, COUNT(*) FROM articles "
+            "WHERE company = ? AND published_at BETWEEN ? AND ? GROUP BY period, sentiment ORDER BY period",
+            (HISTORY_BUCKETS[bucket], _company_key(company_name), low, high)
+        ).fetchall()
+
+    buckets = OrderedDict()
+    for period, sentiment, count in rows:
+        entry = buckets.setdefault(period, {"bucket": period, "Positive": 0, "Negative": 0, "Neutral": 0, "total": 0})
+        entry[sentiment] = entry.get(sentiment, 0) + count
+        entry["total"] += count
+    return list(buckets.values())
+
+
+def topic_history(company_name=None, topic=None, bucket="day", since=None, until=None, limit=10):
+    """Topic frequencies per time bucket for a company, a topic, or both
+
+    Returns [{"bucket", "topics": {topic: count}}] in chronological order, each
+    bucket holding at most limit topics (most frequent first).
+    """
+    if company_name is None and topic is None:
+        raise ValueError("company_name or topic is required")
+    low, high = history_range(since, until)
+    conditions = ["published_at BETWEEN ? AND ?"]
+    params = [HISTORY_BUCKETS[bucket], low, high]
+    if company_name is not None:
+        conditions.append("company = ?")
+        params.append(_company_key(company_name))
+    if topic is not None:
+        conditions.append("topic = ?")
+        params.append(topic)
+    _bump(_history_stats, "queries")
+
+    with _history_lock:
+        rows = _history_db().execute(
+            f"SELECT strftime(?, published_at) AS period, topic, COUNT(*) AS n FROM article_topics "
+            f"WHERE {' AND '.join(conditions)} GROUP BY period, topic ORDER BY period, n DESC, topic",
+            params
+        ).fetchall()
+
+    buckets = OrderedDict()
+    for period, name, count in rows:
+        topics = buckets.setdefault(period, {})
+        if len(topics) < limit:
+            topics[name] = count
+    return [{"bucket": period, "topics": topics} for period, topics in buckets.items()]
+
+
+def analysis_history(company_name, limit=20):
+    """Most recent stored comparative analyses for a company, newest first"""
+    _bump(_history_stats, "queries")
+    with _history_lock:
+        rows = _history_db().execute(
+            "SELECT recorded_at, article_count, analysis FROM analyses WHERE company = ? "
+            "ORDER BY recorded_at DESC LIMIT ?", (_company_key(company_name), limit)
+        ).fetchall()
+    return [{"recorded_at": recorded_at, "article_count": count, "Comparative Sentiment Score": json.loads(analysis)}
+            for recorded_at, count, analysis in rows]
+
+
+def get_history_stats():
+    """Return historical store counters"""
+    with _stats_lock:
+        return dict(_history_stats)
+
+
+def _content_cache_db():
+    """Return the (lazily opened) scraped-content cache database"""
+    global _content_cache_conn
+    if _content_cache_conn is None:
+        with _content_cache_lock:
+            if _content_cache_conn is None:
+                _content_cache_conn = _open_cache_db("content_cache.sqlite3", """
+                    CREATE TABLE IF NOT EXISTS content (
+                        url TEXT PRIMARY KEY,
+                        content TEXT NOT NULL,
+                        etag TEXT,
+                        last_modified TEXT,
+                        size INTEGER NOT NULL,
+                        fetched_at REAL NOT NULL,
+                        accessed_at REAL NOT NULL
+                    );
+                    CREATE INDEX IF NOT EXISTS content_accessed ON content (accessed_at);
+                """)
+    return _content_cache_conn
+
+
+def _content_cache_get(url):
+    """Look up a cached scrape, marking it as recently used"""
+    conn = _content_cache_db()
+    with _content_cache_lock:
+        row = conn.execute(
+            "SELECT content, etag, last_modified, fetched_at FROM content WHERE url = ?", (url,)
+        ).fetchone()
+        if row is None:
+            return None
+        conn.execute("UPDATE content SET accessed_at = ? WHERE url = ?", (time.time(), url))
+        conn.commit()
+    return {"content": row[0], "etag": row[1], "last_modified": row[2], "fetched_at": row[3]}
+
+
+def _content_cache_put(url, content, etag=None, last_modified=None):
+    """Store a scrape and evict least recently used entries beyond the size budget"""
+    conn = _content_cache_db()
+    now = time.time()
+    size = len(content.encode("utf-8"))
+    with _content_cache_lock:
+        conn.execute(
+            "INSERT OR REPLACE INTO content (url, content, etag, last_modified, size, fetched_at, accessed_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (url, content, etag, last_modified, size, now, now)
+        )
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM content").fetchone()[0]
+        if total > CONTENT_CACHE_MAX_BYTES:
+            for victim, victim_size in conn.execute(
+                    "SELECT url, size FROM content ORDER BY accessed_at").fetchall():
+                if total <= CONTENT_CACHE_MAX_BYTES:
+                    break
+                conn.execute("DELETE FROM content WHERE url = ?", (victim,))
+                total -= victim_size
+                _bump(_content_cache_stats, "evictions")
+        conn.commit()
+
+
+def _content_cache_touch(url):
+    """Mark a revalidated entry as freshly fetched"""
+    conn = _content_cache_db()
+    now = time.time()
+    with _content_cache_lock:
+        conn.execute("UPDATE content SET fetched_at = ?, accessed_at = ? WHERE url = ?", (now, now, url))
+        conn.commit()
+
+
+def invalidate_content_cache(url=None):
+    """Drop one URL (or every URL when url is None) from the scraped-content cache"""
+    conn = _content_cache_db()
+    with _content_cache_lock:
+        if url is None:
+            removed = conn.execute("DELETE FROM content").rowcount
+        else:
+            removed = conn.execute("DELETE FROM content WHERE url = ?", (url,)).rowcount
+        conn.commit()
+    return removed
+
+
+def get_content_cache_stats():
+    """Return hit/miss counters and the current size of the scraped-content cache"""
+    with _stats_lock:
+        stats = dict(_content_cache_stats)
+    if CONTENT_CACHE_ENABLED:
+        conn = _content_cache_db()
+        with _content_cache_lock:
+            entries, size = conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM content").fetchone()
+        stats.update(entries=entries, bytes=size, max_bytes=CONTENT_CACHE_MAX_BYTES)
+    return stats
+
+
+class _ParagraphExtractor:
+    """Collects <p> text incrementally, ignoring boilerplate containers"""
+
+    def __init__(self):
+        self.parts = []
+        self.length = 0
+        self.skip_depth = 0
+
+    def add_paragraph(self, text):
+        self.parts.append(text)
+        self.length += len(text) + 1
+
+    def text(self):
+        return " ".join(self.parts)
+
+
+class _LxmlParagraphExtractor(_ParagraphExtractor):
+    """Paragraph extractor backed by lxml's incremental HTML parser"""
+
+    def __init__(self, encoding):
+        super().__init__()
+        self.parser = etree.HTMLPullParser(events=("start", "end"), encoding=encoding)
+
+    def feed(self, data):
+        self.parser.feed(data)
+        self._drain()
+
+    def close(self):
+        try:
+            self.parser.close()
+        except etree.LxmlError:
+            pass
+        self._drain()
+
+    def _drain(self):
+        for event, element in self.parser.read_events():
+            tag = element.tag if isinstance(element.tag, str) else None
+            if tag in SCRAPE_SKIP_TAGS:
+                if event == "start":
+                    self.skip_depth += 1
+                else:
+                    self.skip_depth -= 1
+                    element.clear()
+            elif tag == "p" and event == "end":
+                if not self.skip_depth:
+                    etree.strip_elements(element, *SCRAPE_SKIP_TAGS, with_tail=False)
+                    self.add_paragraph("".join(element.itertext()))
+                element.clear(keep_tail=True)
+
+
+class _StdlibParagraphExtractor(_ParagraphExtractor, HTMLParser):
+    """Paragraph extractor built on html.parser, used when lxml is unavailable"""
+
+    def __init__(self, encoding):
+        _ParagraphExtractor.__init__(self)
+        HTMLParser.__init__(self, convert_charrefs=True)
+        self.decoder = codecs.getincrementaldecoder(encoding or "utf-8")(errors="replace")
+        self.current = None
+
+    def feed(self, data):
+        HTMLParser.feed(self, self.decoder.decode(data))
+
+    def close(self):
+        HTMLParser.feed(self, self.decoder.decode(b"", final=True))
+        HTMLParser.close(self)
+        self._finish_paragraph()
+
+    def _finish_paragraph(self):
+        if self.current is not None:
+            self.add_paragraph("".join(self.current))
+            self.current = None
+
+    def handle_starttag(self, tag, attrs):
+        if tag in SCRAPE_SKIP_TAGS:
+            self.skip_depth += 1
+        elif tag == "p":
+            # An open <p> is implicitly closed by the next one
+            self._finish_paragraph()
+            if not self.skip_depth:
+                self.current = []
+
+    def handle_endtag(self, tag):
+        if tag in SCRAPE_SKIP_TAGS:
+            self.skip_depth = max(0, self.skip_depth - 1)
+        elif tag == "p":
+            self._finish_paragraph()
+
+    def handle_data(self, data):
+        if self.current is not None and not self.skip_depth:
+            self.current.append(data)
+
+
+def _extract_paragraphs(chunks, encoding=None):
+    """Extract article text from a stream of HTML bytes
+
+    Parsing happens chunk by chunk and reading stops as soon as
+    SCRAPE_MAX_CHARS of paragraph text have been collected. Returns
+    (content, bytes_read, parse_seconds, stopped_early).
+    """
+    extractor = _LxmlParagraphExtractor(encoding) if etree is not None else _StdlibParagraphExtractor(encoding)
+    bytes_read = 0
+    parse_seconds = 0.0
+    stopped_early = False
+
     try:
-        response = requests.get(url)
-        soup = BeautifulSoup(response.text, "html.parser")
-        paragraphs = soup.find_all("p")
-        content = " ".join([para.get_text() for para in paragraphs])
-        return content[:3000]  # Limit content length but allow enough for good summarization
-    except:
-        return "Content unavailable"
+        for chunk in chunks:
+            bytes_read += len(chunk)
+            started = time.perf_counter()
+            extractor.feed(chunk)
+            parse_seconds += time.perf_counter() - started
+            if extractor.length >= SCRAPE_MAX_CHARS:
+                stopped_early = True
+                break
+    except ResponseTooLarge:
+        # Keep whatever text was found within the download limit
+        stopped_early = True
+
+    started = time.perf_counter()
+    extractor.close()
+    parse_seconds += time.perf_counter() - started
+
+    # Limit content length but allow enough for good summarization
+    return extractor.text()[:SCRAPE_MAX_CHARS], bytes_read, parse_seconds, stopped_early
+
+
+def _record_scrape(url, bytes_read, parse_seconds, chars, stopped_early):
+    """Keep per-URL scrape measurements and running totals"""
+    with _stats_lock:
+        _scrape_stats["pages"] += 1
+        _scrape_stats["bytes_read"] += bytes_read
+        _scrape_stats["parse_seconds"] += parse_seconds
+        _scrape_stats["stopped_early"] += int(stopped_early)
+        _scrape_log.append({
+            "url": url,
+            "bytes_read": bytes_read,
+            "parse_seconds": parse_seconds,
+            "chars": chars,
+            "stopped_early": stopped_early,
+        })
+
+
+def get_scrape_stats():
+    """Return scrape totals and the most recent per-URL measurements"""
+    with _stats_lock:
+        return {
+            "parser": "lxml" if etree is not None else "html.parser",
+            "totals": dict(_scrape_stats),
+            "recent": list(_scrape_log),
+        }
+
+
+def scrape_article(url):
+    """Scrape news article content from <p> elements
+
+    Scrapes are served from the content cache while fresh; stale entries are
+    revalidated with If-None-Match / If-Modified-Since so unchanged pages come
+    back as a 304 and are not parsed again.
+    """
+    with span("scrape", url=url) as details:
+        try:
+            cached = _content_cache_get(url) if CONTENT_CACHE_ENABLED else None
+            if cached and time.time() - cached["fetched_at"] < CONTENT_CACHE_TTL:
+                _bump(_content_cache_stats, "hits")
+                details["cache"] = "hit"
+                return cached["content"]
+
+            headers = {}
+            if cached:
+                if cached["etag"]:
+                    headers["If-None-Match"] = cached["etag"]
+                if cached["last_modified"]:
+                    headers["If-Modified-Since"] = cached["last_modified"]
+
+            with http_stream(url, headers=headers or None) as (response, chunks):
+                if cached and response.status_code == 304:
+                    _bump(_content_cache_stats, "revalidated")
+                    details["cache"] = "revalidated"
+                    _content_cache_touch(url)
+                    return cached["content"]
+
+                _bump(_content_cache_stats, "misses")
+                # Only trust a declared charset; otherwise let the parser sniff <meta charset>
+                encoding = response.encoding if "charset" in response.headers.get("Content-Type", "").lower() else None
+                content, bytes_read, parse_seconds, stopped_early = _extract_paragraphs(chunks, encoding)
+                _record_scrape(url, bytes_read, parse_seconds, len(content), stopped_early)
+                details.update(cache="miss", bytes=bytes_read)
+
+            if CONTENT_CACHE_ENABLED and response.status_code == 200 and content:
+                _content_cache_put(url, content, response.headers.get("ETag"), response.headers.get("Last-Modified"))
+            return content
+        except:
+            return "Content unavailable"
+
+
+def _llm_cache_db():
+    """Return the (lazily opened) on-disk Gemini response cache"""
+    global _llm_cache_conn
+    if _llm_cache_conn is None:
+        with _llm_cache_lock:
+            if _llm_cache_conn is None:
+                _llm_cache_conn = _open_cache_db("llm_cache.sqlite3", """
+                    CREATE TABLE IF NOT EXISTS responses (
+                        key TEXT PRIMARY KEY,
+                        model TEXT NOT NULL,
+                        text TEXT NOT NULL,
+                        latency REAL NOT NULL,
+                        created_at REAL NOT NULL,
+                        accessed_at REAL NOT NULL
+                    );
+                    CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed_at);
+                """)
+    return _llm_cache_conn
+
+
+def _llm_cache_key(prompt):
+    """Hash the model name and whitespace-normalized prompt"""
+    normalized = " ".join(prompt.split())
+    return hashlib.sha256(f"{GEMINI_MODEL_NAME}\n{normalized}".encode("utf-8")).hexdigest()
+
+
+def _llm_cache_get(key):
+    """Return (text, latency) for a live cache entry, checking memory then disk"""
+    now = time.time()
+    with _llm_cache_lock:
+        entry = _llm_memory_cache.get(key)
+        if entry is not None:
+            text, latency, created_at = entry
+            if now - created_at < LLM_CACHE_TTL:
+                _llm_memory_cache.move_to_end(key)
+                return text, latency
+            del _llm_memory_cache[key]
+
+    if not LLM_CACHE_DISK:
+        return None
+
+    conn = _llm_cache_db()
+    with _llm_cache_lock:
+        row = conn.execute("SELECT text, latency, created_at FROM responses WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        if now - row[2] >= LLM_CACHE_TTL:
+            conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+            conn.commit()
+            return None
+        conn.execute("UPDATE responses SET accessed_at = ? WHERE key = ?", (now, key))
+        conn.commit()
+        _llm_memory_put(key, row[0], row[1], row[2])
+    _bump(_llm_cache_stats, "disk_hits")
+    return row[0], row[1]
+
+
+def _llm_memory_put(key, text, latency, created_at):
+    """Insert into the in-memory LRU tier, evicting the oldest entries"""
+    with _llm_cache_lock:
+        _llm_memory_cache[key] = (text, latency, created_at)
+        _llm_memory_cache.move_to_end(key)
+        while len(_llm_memory_cache) > LLM_CACHE_SIZE:
+            _llm_memory_cache.popitem(last=False)
+            _bump(_llm_cache_stats, "evictions")
+
+
+def _llm_cache_put(key, text, latency):
+    """Store a successfully parsed response in every enabled tier"""
+    now = time.time()
+    _llm_memory_put(key, text, latency, now)
+    _bump(_llm_cache_stats, "stores")
+
+    if LLM_CACHE_DISK:
+        conn = _llm_cache_db()
+        with _llm_cache_lock:
+            conn.execute(
+                "INSERT OR REPLACE INTO responses (key, model, text, latency, created_at, accessed_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (key, GEMINI_MODEL_NAME, text, latency, now, now)
+            )
+            excess = conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0] - LLM_CACHE_DISK_SIZE
+            if excess > 0:
+                conn.execute(
+                    "DELETE FROM responses WHERE key IN "
+                    "(SELECT key FROM responses ORDER BY accessed_at LIMIT ?)", (excess,)
+                )
+            conn.commit()
+
+
+class LlmUnavailable(Exception):
+    """Raised instead of calling Gemini while the circuit breaker is open or the queue is too slow"""
+
+
+def _llm_refill(now):
+    """Add the tokens earned since the last refill (caller holds _llm_scheduler)"""
+    if LLM_RATE <= 0:
+        _llm_state["tokens"] = float(LLM_BURST)
+    else:
+        _llm_state["tokens"] = min(float(LLM_BURST),
+                                   _llm_state["tokens"] + (now - _llm_state["refilled_at"]) * LLM_RATE)
+    _llm_state["refilled_at"] = now
+
+
+def _llm_check_breaker(now):
+    """Fail fast while the breaker is open; after the cooldown let one probe call through
+
+    Returns True when the caller is that probe. Caller holds _llm_scheduler.
+    """
+    if _llm_state["breaker"] == "open":
+        if now - _llm_state["opened_at"] < LLM_BREAKER_COOLDOWN:
+            raise LlmUnavailable("Gemini circuit breaker is open")
+        _llm_state["breaker"] = "half_open"
+    if _llm_state["breaker"] == "half_open":
+        if _llm_state["probing"]:
+            raise LlmUnavailable("Gemini circuit breaker is half-open")
+        _llm_state["probing"] = True
+        return True
+    return False
+
+
+def _llm_acquire(priority):
+    """Wait for a rate-limit token and a concurrency slot, highest priority first
+
+    Returns True if this call is the breaker's probe. Raises LlmUnavailable if
+    the breaker is (or becomes) open or the wait exceeds LLM_QUEUE_TIMEOUT.
+    """
+    ticket = (LLM_PRIORITIES.get(priority, len(LLM_PRIORITIES)), next(_llm_tickets))
+    deadline = time.monotonic() + LLM_QUEUE_TIMEOUT
+    with _llm_scheduler:
+        try:
+            probe = _llm_check_breaker(time.monotonic())
+        except LlmUnavailable:
+            _bump(_llm_scheduler_stats, "rejected")
+            raise
+
+        heapq.heappush(_llm_waiting, ticket)
+        try:
+            while True:
+                now = time.monotonic()
+                _llm_refill(now)
+                if _llm_state["breaker"] == "open":
+                    raise LlmUnavailable("Gemini circuit breaker is open")
+                ready = _llm_waiting[0] == ticket and _llm_state["in_flight"] < _llm_state["limit"]
+                if ready and _llm_state["tokens"] >= 1:
+                    break
+                if now >= deadline:
+                    raise LlmUnavailable(f"No Gemini capacity within {LLM_QUEUE_TIMEOUT}s")
+                timeout = deadline - now
+                if ready:
+                    timeout = min(timeout, (1 - _llm_state["tokens"]) / LLM_RATE)
+                _llm_scheduler.wait(timeout)
+        except LlmUnavailable:
+            _llm_waiting.remove(ticket)
+            heapq.heapify(_llm_waiting)
+            if probe:
+                _llm_state["probing"] = False
+            _bump(_llm_scheduler_stats, "rejected")
+            _llm_scheduler.notify_all()
+            raise
+
+        heapq.heappop(_llm_waiting)
+        _llm_state["tokens"] -= 1
+        _llm_state["in_flight"] += 1
+        _llm_scheduler.notify_all()
+    return probe
+
+
+def _llm_release(outcome, probe):
+    """Return a slot and adapt to the outcome ("ok", "rate_limit" or "error")"""
+    with _llm_scheduler:
+        _llm_state["in_flight"] -= 1
+        if probe:
+            _llm_state["probing"] = False
+
+        if outcome == "ok":
+            _llm_state["failures"] = 0
+            _llm_state["successes"] += 1
+            if _llm_state["successes"] % LLM_CONCURRENCY_STEP == 0:
+                _llm_state["limit"] = min(LLM_MAX_CONCURRENCY, _llm_state["limit"] + 1)
+            _llm_state["breaker"] = "closed"
+        else:
+            _llm_state["failures"] += 1
+            if outcome == "rate_limit":
+                # Back off: halve concurrency and spend the tokens saved up for bursts
+                _llm_state["limit"] = max(1, _llm_state["limit"] // 2)
+                _llm_state["tokens"] = min(_llm_state["tokens"], 0.0)
+                _llm_state["successes"] = 0
+            if _llm_state["breaker"] == "half_open" or _llm_state["failures"] >= LLM_BREAKER_THRESHOLD:
+                if _llm_state["breaker"] != "open":
+                    _bump(_llm_scheduler_stats, "breaker_opens")
+                    print(f"Gemini circuit breaker opened after {_llm_state['failures']} failures")
+                _llm_state["breaker"] = "open"
+                _llm_state["opened_at"] = time.monotonic()
+        _llm_scheduler.notify_all()
+
+
+def _llm_error_kind(error):
+    """Classify a Gemini error as rate_limit, invalid (a bad or blocked response) or transient"""
+    text = f"{type(error).__name__} {error}".lower()
+    if "429" in text or "resourceexhausted" in text or "resource has been exhausted" in text or "quota" in text:
+        return "rate_limit"
+    if isinstance(error, ValueError):
+        return "invalid"
+    return "transient"
+
+
+def scheduled_generate(prompt, priority="summary"):
+    """Call Gemini through the scheduler and return the response text
+
+    Rate-limit and transient errors are retried up to LLM_RETRIES times with
+    full-jitter exponential backoff. Raises LlmUnavailable without calling
+    Gemini while the circuit breaker is open.
+    """
+    for attempt in range(LLM_RETRIES + 1):
+        probe = _llm_acquire(priority)
+        _bump(_llm_scheduler_stats, "calls")
+        try:
+            with span("llm_call", priority=priority):
+                text = get_client("model").generate_content(prompt).text
+        except Exception as e:
+            kind = _llm_error_kind(e)
+            if kind == "invalid":
+                # Gemini answered; the response itself was unusable
+                _llm_release("ok", probe)
+                raise
+            _llm_release("rate_limit" if kind == "rate_limit" else "error", probe)
+            _bump(_llm_scheduler_stats, "rate_limited" if kind == "rate_limit" else "failures")
+            if attempt == LLM_RETRIES:
+                raise
+            _bump(_llm_scheduler_stats, "retries")
+            time.sleep(random.uniform(0, LLM_BACKOFF * 2 ** attempt))
+            continue
+
+        _llm_release("ok", probe)
+        return text
+
+
+def get_llm_scheduler_stats():
+    """Return Gemini scheduler counters, current limits and breaker state"""
+    with _stats_lock:
+        stats = dict(_llm_scheduler_stats)
+    with _llm_scheduler:
+        stats.update(
+            concurrency_limit=_llm_state["limit"],
+            in_flight=_llm_state["in_flight"],
+            waiting=len(_llm_waiting),
+            breaker=_llm_state["breaker"],
+            breaker_open=int(_llm_state["breaker"] == "open"),
+        )
+    return stats
+
+
+def generate_cached(prompt, parse, cacheable=None, priority="summary"):
+    """Run a Gemini prompt through the response cache
+
+    parse(text) turns the raw response into the caller's value and returns None
+    when the response is unusable; only responses that parse (and, if given,
+    satisfy cacheable(parsed)) are cached. Returns the parsed value (or None).
+    Misses go through scheduled_generate at the given priority ("summary",
+    "topics" or "comparison"). Errors from the Gemini call propagate, including
+    LlmUnavailable while the circuit breaker is open.
+    """
+    key = _llm_cache_key(prompt) if LLM_CACHE_ENABLED else None
+    if key is not None:
+        cached = _llm_cache_get(key)
+        if cached is not None:
+            parsed = parse(cached[0])
+            if parsed is not None:
+                _bump(_llm_cache_stats, "hits")
+                _bump(_llm_cache_stats, "saved_seconds", cached[1])
+                return parsed
+
+    _bump(_llm_cache_stats, "misses")
+    started = time.perf_counter()
+    text = scheduled_generate(prompt, priority)
+    latency = time.perf_counter() - started
+
+    parsed = parse(text)
+    if parsed is not None and key is not None and (cacheable is None or cacheable(parsed)):
+        _llm_cache_put(key, text, latency)
+    return parsed
+
+
+def get_llm_cache_stats():
+    """Return Gemini cache counters, including the LLM latency saved by hits"""
+    with _stats_lock:
+        stats = dict(_llm_cache_stats)
+    with _llm_cache_lock:
+        stats["memory_entries"] = len(_llm_memory_cache)
+    if LLM_CACHE_DISK:
+        with _llm_cache_lock:
+            stats["disk_entries"] = _llm_cache_db().execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+    return stats
+
+
+def clear_llm_cache():
+    """Empty every tier of the Gemini response cache"""
+    with _llm_cache_lock:
+        _llm_memory_cache.clear()
+        if LLM_CACHE_DISK:
+            _llm_cache_db().execute("DELETE FROM responses")
+            _llm_cache_db().commit()
 
 
 def generate_summary(content, company_name):
     """Generate a concise summary using Gemini API"""
+    return _generate_summary(content, company_name)[0]
+
+
+@span("summary")
+def _generate_summary(content, company_name):
+    """Return (summary, fell_back); fell_back is True when Gemini failed and the content was truncated instead"""
     if content == "Content unavailable" or len(content) < 100:
-        return "Summary unavailable"
+        return "Summary unavailable", False
 
     try:
         prompt = f"""
@@ -278,29 +2426,140 @@ def generate_summary(content, company_name):
         {content[:2000]}
         """
 
-        response = model.generate_content(prompt)
-        summary = response.text.strip()
+        summary = generate_cached(prompt, lambda text: text.strip() or None)
+        if summary is None:
+            raise ValueError("empty summary response")
 
         # Limit summary length
         if len(summary) > 300:
             summary = summary[:297] + "..."
 
-        return summary
+        return summary, False
     except Exception as e:
         print(f"Summary Generation Error: {e}")
         # Fallback to first 200 chars if Gemini fails
-        return content[:200] + "..." if len(content) > 200 else content
+        return (content[:200] + "..." if len(content) > 200 else content), True
+
+
+def _parse_batch_analysis(text, count):
+    """Parse a batch analysis response into {index: (summary, topics)}
+
+    Entries that are missing or malformed are left out so the caller can fall
+    back for just those articles. Returns None when nothing usable was found.
+    """
+    try:
+        items = json.loads(_strip_code_fence(text))
+    except ValueError:
+        return None
+    if not isinstance(items, list):
+        return None
+
+    results = {}
+    for item in items:
+        if not isinstance(item, dict):
+            continue
+        index = item.get("id")
+        summary = item.get("summary")
+        topics = item.get("topics")
+        if not isinstance(index, int) or not 1 <= index <= count:
+            continue
+        if not isinstance(summary, str) or not summary.strip():
+            continue
+        if not isinstance(topics, list) or not topics or not all(isinstance(t, str) for t in topics):
+            continue
+        summary = summary.strip()
+        if len(summary) > 300:
+            summary = summary[:297] + "..."
+        results[index - 1] = (summary, topics[:3])
+
+    return results or None
+
+
+def analyze_articles_batch(articles, company_name):
+    """Summarize and tag several articles with a single Gemini call
+
+    articles is a list of (title, content) pairs; returns a list of
+    (summary, topics) pairs in the same order. Only articles with enough content
+    to summarize are sent; the others get "Summary unavailable" and rule-based
+    topics from their title. Articles the batch response does not cover
+    correctly fall back to generate_summary / extract_topics.
+    """
+    return [(summary, topics) for summary, topics, _ in _analyze_articles_batch(articles, company_name)]
+
+
+@span("batch_analysis")
+def _analyze_articles_batch(articles, company_name):
+    """analyze_articles_batch, returning (summary, topics, fell_back) triples
+
+    fell_back is True when an article's summary or topics are the
+    truncated-content or rule-based fallbacks rather than Gemini's.
+    """
+    summarizable = [index for index, (_, content) in enumerate(articles)
+                    if content != "Content unavailable" and len(content) >= 100]
+    parsed = {}
+    if summarizable:
+        parsed = _analyze_summarizable_batch([articles[index] for index in summarizable], company_name)
+        parsed = {summarizable[position]: result for position, result in parsed.items()}
+
+    def analyze(index):
+        title, content = articles[index]
+        if content == "Content unavailable" or len(content) < 100:
+            return "Summary unavailable", rule_based_topic_extraction(title, content), False
+        if index in parsed:
+            return parsed[index] + (False,)
+        summary, summary_fell_back = _generate_summary(content, company_name)
+        topics, topics_fell_back = _extract_topics(title, content, company_name)
+        return summary, topics, summary_fell_back or topics_fell_back
+
+    return _map(analyze, range(len(articles)))
+
+
+def _analyze_summarizable_batch(articles, company_name):
+    """Send (title, content) pairs to Gemini in one prompt; returns {index: (summary, topics)} for those covered"""
+    sections = []
+    for i, (title, content) in enumerate(articles):
+        sections.append(f"""
+        ARTICLE {i + 1}:
+        Title: {title}
+        Content: {content[:2000]}
+        """)
+
+    prompt = f"""
+    Analyze each of the following {len(articles)} news articles about {company_name}.
+
+    For every article write a 2-3 sentence concise summary and list its 2-3 main topics.
+    Choose topics from: {", ".join(TOPIC_KEYWORDS)}.
+
+    Respond with ONLY a JSON array containing one object per article, like:
+    [{{"id": 1, "summary": "...", "topics": ["Electric Vehicles", "Innovation"]}}]
+    {"".join(sections)}
+    """
+
+    try:
+        parsed = generate_cached(
+            prompt,
+            lambda text: _parse_batch_analysis(text, len(articles)),
+            cacheable=lambda results: len(results) == len(articles)
+        ) or {}
+    except Exception as e:
+        print(f"Batch Analysis Error: {e}")
+        parsed = {}
+    return parsed
 
 
 def extract_topics(title, content, company_name):
     """Extract multiple topics for an article using Gemini API"""
+    return _extract_topics(title, content, company_name)[0]
+
+
+@span("topics")
+def _extract_topics(title, content, company_name):
+    """Return (topics, fell_back); fell_back is True when rule-based topics replaced Gemini's"""
     try:
         prompt = f"""
         List the 2-3 main topics of this news article about {company_name}.
         Respond with ONLY a JSON array of strings (topic names only). 
-        Choose from: Electric Vehicles, Stock Market, Innovation, Regulations, 
-        Autonomous Vehicles, Financial Results, Product Launch, Leadership, 
-        Partnerships, Competition, Sustainability, Manufacturing, Global Markets.
+        Choose from: {", ".join(TOPIC_KEYWORDS)}.
 
         Example response: ["Electric Vehicles", "Innovation", "Competition"]
 
@@ -308,102 +2567,712 @@ def extract_topics(title, content, company_name):
         First part of article: {content[:500]}
         """
 
-        response = model.generate_content(prompt)
-        topics_text = response.text.strip()
-
-        # Try to parse as JSON
-        try:
-            topics = json.loads(topics_text)
-            # Ensure it's a list of strings and limit to 3 topics
-            if isinstance(topics, list) and all(isinstance(item, str) for item in topics):
-                return topics[:3]
-        except:
-            # If JSON parsing fails, try to extract from text
-            pass
+        topics = generate_cached(prompt, _parse_topics, priority="topics")
+        if topics is not None:
+            return topics, False
 
         # Fallback to rule-based extraction
-        return rule_based_topic_extraction(title, content)
+        return rule_based_topic_extraction(title, content), True
     except Exception as e:
         print(f"Topic Extraction Error: {e}")
         # Fall back to rule-based extraction
-        return rule_based_topic_extraction(title, content)
+        return rule_based_topic_extraction(title, content), True
 
 
-def rule_based_topic_extraction(title, content):
-    """Extract multiple topics based on rules and keywords"""
-    # Common topics in business/company news with keywords
-    topic_keywords = {
-        "Electric Vehicles": ["ev", "electric vehicle", "battery", "charging"],
-        "Stock Market": ["stock", "shares", "market", "investor", "nasdaq", "wall street"],
-        "Innovation": ["innovation", "tech", "technology", "breakthrough", "cutting-edge"],
-        "Regulations": ["regulator", "compliance", "law", "legal", "government", "policy"],
-        "Autonomous Vehicles": ["autonomous", "self-driving", "autopilot", "driver assist"],
-        "Financial Results": ["earnings", "revenue", "profit", "quarterly", "financial"],
-        "Product Launch": ["launch", "new", "introduce", "unveil", "announce"],
-        "Leadership": ["ceo", "executive", "management", "appoint", "hire", "board"],
-        "Partnerships": ["partner", "collaboration", "joint venture", "alliance", "deal"],
-        "Competition": ["competitor", "rival", "versus", "market share", "industry"],
-        "Sustainability": ["sustainable", "green", "environment", "carbon", "emission"],
-        "Manufacturing": ["factory", "production", "manufacturing", "supply chain", "assembly"],
-        "Global Markets": ["global", "international", "overseas", "export", "foreign"]
-    }
+def _parse_topics(text):
+    """Parse a JSON array of topic names, returning None if the response is unusable"""
+    try:
+        topics = json.loads(text.strip())
+    except ValueError:
+        return None
+    # Ensure it's a list of strings and limit to 3 topics
+    if isinstance(topics, list) and all(isinstance(item, str) for item in topics):
+        return topics[:3]
+    return None
+
+
+# Common topics in business/company news with keywords. TOPIC_TAXONOMY_FILE may
+# point to a JSON object of the same shape ({"Topic": ["keyword", ...]}) to
+# replace it; see load_topic_taxonomy.
+DEFAULT_TOPIC_KEYWORDS = {
+    "Electric Vehicles": ["ev", "electric vehicle", "battery", "charging"],
+    "Stock Market": ["stock", "shares", "market", "investor", "nasdaq", "wall street"],
+    "Innovation": ["innovation", "tech", "technology", "breakthrough", "cutting-edge"],
+    "Regulations": ["regulator", "compliance", "law", "lawsuit", "lawmaker", "legal", "government", "policy"],
+    "Autonomous Vehicles": ["autonomous", "self-driving", "autopilot", "driver assist"],
+    "Financial Results": ["earnings", "revenue", "profit", "quarterly", "financial"],
+    "Product Launch": ["launch", "new", "introduce", "unveil", "announce"],
+    "Leadership": ["ceo", "executive", "management", "appoint", "hire", "board"],
+    "Partnerships": ["partner", "collaboration", "joint venture", "alliance", "deal"],
+    "Competition": ["competitor", "rival", "versus", "market share", "industry"],
+    "Sustainability": ["sustainable", "green", "environment", "carbon", "emission"],
+    "Manufacturing": ["factory", "production", "manufacturing", "supply chain", "assembly"],
+    "Global Markets": ["global", "international", "overseas", "export", "foreign"]
+}
+
+# Separates documents in a batch; the tokenizer never turns it into a space, so
+# no keyword phrase can match across two documents.
+_TOPIC_DOCUMENT_SEPARATOR = "\x00"
+# Everything except letters, digits, hyphens and the document separator splits words
+_TOPIC_WORD_BREAKS = str.maketrans({
+    char: " " for char in string.punctuation.replace("-", "") + "\u2018\u2019\u201c\u201d\u2013\u2014\u2026"
+})
+
+
+# Keywords this short only match whole words or their plural ("ev" and "evs"
+# but not "every"); longer ones match at the start of a word ("announce" in
+# "announced")
+_TOPIC_EXACT_MAX_LENGTH = 3
+# Distinct words whose prefix matches are remembered before the memo starts over
+_TOPIC_WORD_CACHE_SIZE = 100000
+
+
+def _compile_topic_matcher(topic_keywords):
+    """Build the matcher used by rule_based_topic_extraction
+
+    Text is split into words once. Short single-word keywords (and their "s"
+    plurals) are found with one set intersection; longer ones by looking up each word's prefixes of the
+    keyword lengths in use (memoized per word), so inflections ("partnership",
+    "regulatory") still match while keywords never match in the middle of other
+    words. The cost no longer grows with the number of topics. Multi-word
+    keywords are checked as phrases starting at a word, only when their first
+    word occurs in the text.
+    """
+    exact = {}
+    prefixes = {}
+    phrases = {}
+    for topic, keywords in topic_keywords.items():
+        for keyword in keywords:
+            keyword = " ".join(keyword.lower().translate(_TOPIC_WORD_BREAKS).split())
+            if " " in keyword:
+                phrases.setdefault(f" {keyword}", set()).add(topic)
+            elif len(keyword) > _TOPIC_EXACT_MAX_LENGTH:
+                prefixes.setdefault(keyword, set()).add(topic)
+            elif keyword:
+                exact.setdefault(keyword, set()).add(topic)
+                exact.setdefault(keyword + "s", set()).add(topic)
 
-    found_topics = []
-    combined_text = (title + " " + content[:500]).lower()
+    return {
+        "topics": list(topic_keywords),
+        "exact": exact,
+        "exact_set": frozenset(exact),
+        "prefixes": prefixes,
+        "prefix_lengths": sorted({len(keyword) for keyword in prefixes}),
+        # Topics found by prefix for each word seen so far
+        "word_topics": {},
+        "phrases": [(phrase, phrase.split()[0], topics) for phrase, topics in phrases.items()],
+        "phrase_first_words": frozenset(phrase.split()[0] for phrase in phrases),
+    }
 
-    # Check for each topic's keywords in the text
-    for topic, keywords in topic_keywords.items():
-        if any(keyword in combined_text for keyword in keywords):
-            found_topics.append(topic)
 
+def _match_topics(matcher, text):
+    """Return the set of topics whose keywords occur in already-tokenizable text"""
+    tokens = text.split()
+    words = set(tokens)
+    if "-" in text:
+        # Hyphenated compounds also count as their parts ("ev-maker" mentions "ev")
+        words.update(text.replace("-", " ").split())
+
+    found = set()
+    for word in words & matcher["exact_set"]:
+        found |= matcher["exact"][word]
+
+    prefixes = matcher["prefixes"]
+    lengths = matcher["prefix_lengths"]
+    word_topics = matcher["word_topics"]
+    for word in words:
+        topics = word_topics.get(word)
+        if topics is None:
+            topics = frozenset().union(*(prefixes.get(word[:length], ()) for length in lengths
+                                         if length <= len(word)))
+            if len(word_topics) >= _TOPIC_WORD_CACHE_SIZE:
+                word_topics.clear()
+            word_topics[word] = topics
+        found |= topics
+
+    if not matcher["phrase_first_words"].isdisjoint(words):
+        padded = " " + " ".join(tokens)
+        for phrase, first_word, topics in matcher["phrases"]:
+            if first_word in words and phrase in padded:
+                found |= topics
+    return found
+
+
+def _order_topics(matcher, found):
+    """Return found topics in taxonomy order, limited to 3, or the default topic"""
     # Limit to 3 topics, or return default if none found
-    if found_topics:
-        return found_topics[:3]
-    else:
-        return ["Company News"]
+    ordered = [topic for topic in matcher["topics"] if topic in found]
+    return ordered[:3] if ordered else ["Company News"]
 
 
-def analyze_sentiment(text):
-    """Perform sentiment analysis on given text"""
-    sentiment = analyzer.polarity_scores(text)
-    if sentiment['compound'] >= 0.05:
+def load_topic_taxonomy(taxonomy):
+    """Replace the rule-based topic taxonomy
+
+    taxonomy is either a {"Topic": ["keyword", ...]} dict or the path of a JSON
+    file containing one. The matcher is rebuilt once and swapped in atomically.
+    """
+    global TOPIC_KEYWORDS, _topic_matcher
+    if isinstance(taxonomy, str):
+        with open(taxonomy, encoding="utf-8") as f:
+            taxonomy = json.load(f)
+    if not isinstance(taxonomy, dict) or not all(
+            isinstance(keywords, list) and all(isinstance(k, str) for k in keywords)
+            for keywords in taxonomy.values()):
+        raise ValueError("Topic taxonomy must map topic names to lists of keywords")
+
+    matcher = _compile_topic_matcher(taxonomy)
+    TOPIC_KEYWORDS, _topic_matcher = dict(taxonomy), matcher
+
+
+TOPIC_KEYWORDS = DEFAULT_TOPIC_KEYWORDS
+_topic_matcher = _compile_topic_matcher(TOPIC_KEYWORDS)
+if os.getenv("TOPIC_TAXONOMY_FILE"):
+    load_topic_taxonomy(os.getenv("TOPIC_TAXONOMY_FILE"))
+
+
+def rule_based_topic_extraction(title, content):
+    """Extract multiple topics based on rules and keywords"""
+    matcher = _topic_matcher
+    combined_text = (title + " " + content[:500]).lower().translate(_TOPIC_WORD_BREAKS)
+    return _order_topics(matcher, _match_topics(matcher, combined_text))
+
+
+def rule_based_topic_extraction_batch(items):
+    """Extract topics for many (title, content) pairs in one pass
+
+    All documents are lowercased and tokenized as one string and then matched
+    against the shared keyword table. Returns one topic list per item.
+    """
+    if not items:
+        return []
+    matcher = _topic_matcher
+    combined_text = _TOPIC_DOCUMENT_SEPARATOR.join(
+        title + " " + content[:500] for title, content in items
+    ).lower().translate(_TOPIC_WORD_BREAKS)
+    return [_order_topics(matcher, _match_topics(matcher, text))
+            for text in combined_text.split(_TOPIC_DOCUMENT_SEPARATOR)]
+
+
+def _sentiment_key(text, sentence_level):
+    """Content hash used to memoize sentiment scores"""
+    prefix = b"s:" if sentence_level else b"d:"
+    return hashlib.blake2b(prefix + text.encode("utf-8"), digest_size=16).hexdigest()
+
+
+def _sentiment_cache_get(key):
+    with _sentiment_cache_lock:
+        score = _sentiment_cache.get(key)
+        if score is not None:
+            _sentiment_cache.move_to_end(key)
+        return score
+
+
+def _sentiment_cache_put(key, score):
+    with _sentiment_cache_lock:
+        _sentiment_cache[key] = score
+        _sentiment_cache.move_to_end(key)
+        while len(_sentiment_cache) > SENTIMENT_CACHE_SIZE:
+            _sentiment_cache.popitem(last=False)
+
+
+def _vader_scores(texts):
+    """Compound VADER scores for a list of texts (runs in a pool worker or inline)"""
+    analyzer = get_client("analyzer")
+    return [analyzer.polarity_scores(text)["compound"] for text in texts]
+
+
+def _get_sentiment_pool():
+    """Return the process pool used for large sentiment batches"""
+    global _sentiment_pool
+    if _sentiment_pool is None:
+        with _sentiment_cache_lock:
+            if _sentiment_pool is None:
+                _sentiment_pool = ProcessPoolExecutor(max_workers=SENTIMENT_PROCESSES)
+    return _sentiment_pool
+
+
+def _score_uncached(texts):
+    """Score texts with VADER, spreading large batches across the process pool"""
+    if SENTIMENT_PROCESSES > 0 and len(texts) >= SENTIMENT_PROCESS_MIN_BATCH:
+        chunk = -(-len(texts) // SENTIMENT_PROCESSES)
+        chunks = [texts[i:i + chunk] for i in range(0, len(texts), chunk)]
+        try:
+            return [score for scores in _get_sentiment_pool().map(_vader_scores, chunks) for score in scores]
+        except Exception as e:
+            print(f"Sentiment Pool Error: {e}")
+    return _vader_scores(texts)
+
+
+def _score_memoized(texts, sentence_level=False):
+    """Return compound scores for texts, scoring each distinct uncached text once"""
+    keys = [_sentiment_key(text, sentence_level) for text in texts]
+    scores = [_sentiment_cache_get(key) for key in keys]
+
+    missing = {}
+    for text, key, score in zip(texts, keys, scores):
+        if score is None:
+            missing.setdefault(key, text)
+    _bump(_sentiment_stats, "hits", len(texts) - sum(score is None for score in scores))
+    _bump(_sentiment_stats, "misses", len(missing))
+
+    if missing:
+        computed = dict(zip(missing, _score_uncached(list(missing.values()))))
+        for key, score in computed.items():
+            _sentiment_cache_put(key, score)
+        scores = [computed[key] if score is None else score for key, score in zip(keys, scores)]
+    return scores
+
+
+@span("sentiment")
+def score_sentiments(texts, sentence_level=None):
+    """Return VADER compound scores for many documents
+
+    Scores are memoized by content hash. With sentence_level (defaults to
+    SENTIMENT_SENTENCE_LEVEL) each document is split into sentences, every
+    sentence is scored (and cached) on its own, and the document score is the
+    mean of its sentence scores, so documents sharing sentences reuse work.
+    """
+    texts = list(texts)
+    if sentence_level is None:
+        sentence_level = SENTIMENT_SENTENCE_LEVEL
+    if not sentence_level:
+        return _score_memoized(texts)
+
+    doc_keys = [_sentiment_key(text, True) for text in texts]
+    scores = [_sentiment_cache_get(key) for key in doc_keys]
+    pending = [i for i, score in enumerate(scores) if score is None]
+    if pending:
+        sentences = {i: [s for s in _SENTENCE_BOUNDARY.split(texts[i]) if s.strip()] or [texts[i]]
+                     for i in pending}
+        sentence_scores = iter(_score_memoized([s for i in pending for s in sentences[i]]))
+        for i in pending:
+            values = [next(sentence_scores) for _ in sentences[i]]
+            scores[i] = sum(values) / len(values)
+            _sentiment_cache_put(doc_keys[i], scores[i])
+    return scores
+
+
+def sentiment_label(compound):
+    """Map a VADER compound score to Positive / Negative / Neutral"""
+    if compound >= 0.05:
         return "Positive"
-    elif sentiment['compound'] <= -0.05:
+    elif compound <= -0.05:
         return "Negative"
     else:
         return "Neutral"
 
 
+def analyze_sentiments(texts, sentence_level=None):
+    """Perform sentiment analysis on many texts (article bodies, titles, summaries) at once"""
+    return [sentiment_label(score) for score in score_sentiments(texts, sentence_level)]
+
+
+def analyze_sentiment(text):
+    """Perform sentiment analysis on given text"""
+    return analyze_sentiments([text])[0]
+
+
+def get_sentiment_stats():
+    """Return sentiment cache counters"""
+    with _stats_lock:
+        stats = dict(_sentiment_stats)
+    with _sentiment_cache_lock:
+        stats["entries"] = len(_sentiment_cache)
+    return stats
+
+
+def _tts_cache_key(text, lang, slow, tld):
+    """Hash the source text together with the voice settings"""
+    return hashlib.sha256(json.dumps([text, lang, slow, tld]).encode("utf-8")).hexdigest()
+
+
+def _tts_cache_path(key):
+    return os.path.join(TTS_CACHE_DIR, f"{key}.mp3")
+
+
+def _evict_tts_cache():
+    """Delete the least recently used cached audio files beyond TTS_CACHE_MAX_BYTES"""
+    entries = []
+    for name in os.listdir(TTS_CACHE_DIR):
+        if not name.endswith(".mp3"):
+            continue
+        path = os.path.join(TTS_CACHE_DIR, name)
+        try:
+            info = os.stat(path)
+        except FileNotFoundError:
+            continue
+        entries.append((info.st_mtime, info.st_size, path))
+
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total <= TTS_CACHE_MAX_BYTES:
+            break
+        try:
+            os.remove(path)
+            _bump(_tts_cache_stats, "evictions")
+        except FileNotFoundError:
+            pass
+        total -= size
+
+
+def cleanup_tts_files(max_age=None):
+    """Remove orphaned speech files older than max_age seconds
+
+    Covers the per-request speech_*.mp3 / comparative_speech_*.mp3 files that
+    used to be written to the temp directory, and partial writes left in the
+    TTS cache by crashed workers. Returns the number of files removed.
+    """
+    max_age = TTS_ORPHAN_MAX_AGE if max_age is None else max_age
+    cutoff = time.time() - max_age
+    candidates = []
+
+    temp_dir = tempfile.gettempdir()
+    for name in os.listdir(temp_dir):
+        if name.endswith(".mp3") and (name.startswith("speech_") or name.startswith("comparative_speech_")):
+            candidates.append(os.path.join(temp_dir, name))
+    if os.path.isdir(TTS_CACHE_DIR):
+        candidates.extend(os.path.join(TTS_CACHE_DIR, name) for name in os.listdir(TTS_CACHE_DIR)
+                          if name.endswith(".part"))
+
+    removed = 0
+    for path in candidates:
+        try:
+            if os.path.getmtime(path) < cutoff:
+                os.remove(path)
+                removed += 1
+        except OSError:
+            pass
+    return removed
+
+
+def _maybe_cleanup_tts_files():
+    """Run cleanup_tts_files at most once per TTS_CLEANUP_INTERVAL seconds"""
+    global _tts_last_cleanup
+    now = time.time()
+    with _tts_cache_lock:
+        if now - _tts_last_cleanup < TTS_CLEANUP_INTERVAL:
+            return
+        _tts_last_cleanup = now
+    cleanup_tts_files()
+
+
+def get_tts_cache_stats():
+    """Return TTS cache counters and current size"""
+    with _stats_lock:
+        stats = dict(_tts_cache_stats)
+    sizes = []
+    names = os.listdir(TTS_CACHE_DIR) if os.path.isdir(TTS_CACHE_DIR) else []
+    for name in names:
+        if not name.endswith(".mp3"):
+            continue
+        try:
+            sizes.append(os.stat(os.path.join(TTS_CACHE_DIR, name)).st_size)
+        except FileNotFoundError:
+            # Evicted or cleaned up since the directory was listed
+            continue
+    stats["entries"] = len(sizes)
+    stats["bytes"] = sum(sizes)
+    return stats
+
+
+def _tts_memory_get(key):
+    with _tts_cache_lock:
+        audio = _tts_memory_cache.get(key)
+        if audio is not None:
+            _tts_memory_cache.move_to_end(key)
+        return audio
+
+
+def _tts_memory_put(key, audio):
+    with _tts_cache_lock:
+        _tts_memory_cache[key] = audio
+        _tts_memory_cache.move_to_end(key)
+        while len(_tts_memory_cache) > TTS_MEMORY_CACHE_SIZE:
+            _tts_memory_cache.popitem(last=False)
+
+
+def _persist_tts(key, audio):
+    """Write audio into the on-disk TTS cache via a private file and atomic rename"""
+    os.makedirs(TTS_CACHE_DIR, exist_ok=True)
+    partial_path = os.path.join(TTS_CACHE_DIR, f"{key}.{uuid.uuid4()}.part")
+    with open(partial_path, "wb") as f:
+        f.write(audio)
+    os.replace(partial_path, _tts_cache_path(key))
+    _evict_tts_cache()
+    _maybe_cleanup_tts_files()
+
+
+def _translation_cache_db():
+    """Return the (lazily opened) on-disk translation memo"""
+    global _translation_cache_conn
+    if _translation_cache_conn is None:
+        with _translation_cache_lock:
+            if _translation_cache_conn is None:
+                _translation_cache_conn = _open_cache_db("translation_cache.sqlite3", """
+                    CREATE TABLE IF NOT EXISTS translations (
+                        key TEXT PRIMARY KEY,
+                        lang TEXT NOT NULL,
+                        source TEXT NOT NULL,
+                        text TEXT NOT NULL,
+                        accessed_at REAL NOT NULL
+                    );
+                    CREATE INDEX IF NOT EXISTS translations_accessed ON translations (accessed_at);
+                """)
+    return _translation_cache_conn
+
+
+def _translation_cache_key(text, lang):
+    return hashlib.sha256(json.dumps([" ".join(text.split()), lang]).encode("utf-8")).hexdigest()
+
+
+def _translation_memory_put(key, text):
+    with _translation_cache_lock:
+        _translation_memory_cache[key] = text
+        _translation_memory_cache.move_to_end(key)
+        while len(_translation_memory_cache) > TRANSLATION_CACHE_SIZE:
+            _translation_memory_cache.popitem(last=False)
+
+
+def _translation_cache_get(key):
+    """Return a memoized translation, checking memory then disk"""
+    with _translation_cache_lock:
+        text = _translation_memory_cache.get(key)
+        if text is not None:
+            _translation_memory_cache.move_to_end(key)
+            _bump(_translation_stats, "hits")
+            return text
+
+        conn = _translation_cache_db()
+        row = conn.execute("SELECT text FROM translations WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        conn.execute("UPDATE translations SET accessed_at = ? WHERE key = ?", (time.time(), key))
+        conn.commit()
+        _translation_memory_put(key, row[0])
+    _bump(_translation_stats, "disk_hits")
+    return row[0]
+
+
+def _translation_cache_put(entries, lang):
+    """Memoize (key, source, translation) triples in memory and on disk"""
+    now = time.time()
+    with _translation_cache_lock:
+        for key, _, text in entries:
+            _translation_memory_put(key, text)
+        conn = _translation_cache_db()
+        conn.executemany(
+            "INSERT OR REPLACE INTO translations (key, lang, source, text, accessed_at) VALUES (?, ?, ?, ?, ?)",
+            [(key, lang, source, text, now) for key, source, text in entries]
+        )
+        excess = conn.execute("SELECT COUNT(*) FROM translations").fetchone()[0] - TRANSLATION_CACHE_DISK_SIZE
+        if excess > 0:
+            conn.execute(
+                "DELETE FROM translations WHERE key IN "
+                "(SELECT key FROM translations ORDER BY accessed_at LIMIT ?)", (excess,)
+            )
+        conn.commit()
+
+
+def _translate_round_trip(sources, lang):
+    """Translate several strings with a single request and return the translations
+
+    The strings are sent newline-separated; if the service does not hand back
+    the same number of lines, they are translated one by one instead.
+    """
+    _bump(_translation_stats, "round_trips")
+    translator = get_client("translator")
+    joined = _translate(translator, _TRANSLATION_SEPARATOR.join(sources), lang)
+    parts = [part.strip() for part in joined.split(_TRANSLATION_SEPARATOR)]
+    if len(parts) == len(sources) and all(parts):
+        return parts
+
+    _bump(_translation_stats, "round_trips", len(sources))
+    return [_translate(translator, source, lang) for source in sources]
+
+
+def _translate(translator, text, lang):
+    """Translate one string with either googletrans API: 3.x/4.0 rc returns the result, 4.x a coroutine"""
+    result = translator.translate(text, dest=lang)
+    if inspect.isawaitable(result):
+        result = asyncio.run_coroutine_threadsafe(_await(result), _get_translation_loop()).result()
+    return result.text
+
+
+async def _await(awaitable):
+    """Wrap any awaitable in a coroutine for run_coroutine_threadsafe"""
+    return await awaitable
+
+
+def _get_translation_loop():
+    """Return the event loop that runs async googletrans calls
+
+    One loop per process, on its own thread, so the translator's HTTP client
+    always runs on the loop it was first used on.
+    """
+    global _translation_loop
+    if _translation_loop is None:
+        with _translation_cache_lock:
+            if _translation_loop is None:
+                loop = asyncio.new_event_loop()
+                threading.Thread(target=loop.run_forever, name="translate-loop", daemon=True).start()
+                _translation_loop = loop
+    return _translation_loop
+
+
+def _get_translation_executor():
+    global _translation_executor
+    if _translation_executor is None:
+        with _translation_cache_lock:
+            if _translation_executor is None:
+                _translation_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="translate")
+    return _translation_executor
+
+
+@span("translation")
+def translate_texts(texts, lang=TTS_LANG, timeout=None):
+    """Translate a batch of strings, returning (translations, all_translated)
+
+    Memoized strings are answered from the cache; the rest are translated
+    together in one round-trip. If that takes longer than timeout seconds
+    (TRANSLATION_TIMEOUT by default) or fails, the original strings are used
+    in their place. A round-trip that finishes after its timeout still fills
+    the cache for the next call.
+    """
+    timeout = TRANSLATION_TIMEOUT if timeout is None else timeout
+    results = list(texts)
+    pending = {}
+    for i, text in enumerate(texts):
+        if not text.strip():
+            continue
+        key = _translation_cache_key(text, lang)
+        cached = _translation_cache_get(key)
+        if cached is not None:
+            results[i] = cached
+        else:
+            pending.setdefault(key, (text.strip(), []))[1].append(i)
+
+    if not pending:
+        return results, True
+    _bump(_translation_stats, "misses", len(pending))
+
+    keys = list(pending)
+    sources = [pending[key][0] for key in keys]
+
+    def remember(future):
+        if future.cancelled() or future.exception() is not None:
+            return
+        _translation_cache_put(list(zip(keys, sources, future.result())), lang)
+
+    future = _get_translation_executor().submit(_with_context(_translate_round_trip), sources, lang)
+    future.add_done_callback(remember)
+    try:
+        translations = future.result(timeout=timeout)
+    except FutureTimeoutError:
+        print(f"Translation Error: no response within {timeout}s, using original text")
+        _bump(_translation_stats, "timeouts")
+        return results, False
+    except Exception as e:
+        print(f"Translation Error: {e}")
+        _bump(_translation_stats, "failures")
+        return results, False
+
+    for key, translation in zip(keys, translations):
+        for i in pending[key][1]:
+            results[i] = translation
+    return results, True
+
+
+def translate_text(text, lang=TTS_LANG, timeout=None):
+    """Translate one string; returns (translation, translated) like translate_texts"""
+    translations, translated = translate_texts([text], lang, timeout)
+    return translations[0], translated
+
+
+def get_translation_stats():
+    """Return translation memo counters"""
+    with _stats_lock:
+        stats = dict(_translation_stats)
+    with _translation_cache_lock:
+        stats["memory_entries"] = len(_translation_memory_cache)
+    return stats
+
+
+def synthesize_speech(text):
+    """Convert text to Hindi speech and return the MP3 bytes
+
+    Audio comes from the in-memory cache, then the on-disk cache, and is only
+    translated and synthesized (straight into a memory buffer) on a miss.
+    Audio synthesized from untranslated text is returned but not cached.
+    """
+    key = _tts_cache_key(text, TTS_LANG, TTS_SLOW, TTS_TLD)
+
+    audio = _tts_memory_get(key)
+    if audio is not None:
+        _bump(_tts_cache_stats, "hits")
+        return audio
+
+    cached_path = _tts_cache_path(key)
+    try:
+        with open(cached_path, "rb") as f:
+            audio = f.read()
+        os.utime(cached_path)  # mark as recently used
+    except FileNotFoundError:
+        audio = None
+    if audio:
+        _bump(_tts_cache_stats, "hits")
+        _tts_memory_put(key, audio)
+        return audio
+
+    _bump(_tts_cache_stats, "misses")
+
+    # Translate text to Hindi sentence by sentence, so the template sentences
+    # shared by most reports come from the translation memo; if translation
+    # fails or times out, the original text is used
+    sentences = [sentence for sentence in _SENTENCE_BOUNDARY.split(text.strip()) if sentence]
+    translations, translated = translate_texts(sentences or [text], TTS_LANG)
+    translated_text = " ".join(translations)
+
+    # Convert Hindi text to speech
+    buffer = io.BytesIO()
+    gTTS = get_client("gtts")
+    with span("tts", chars=len(translated_text)):
+        gTTS(text=translated_text, lang=TTS_LANG, slow=TTS_SLOW, tld=TTS_TLD).write_to_fp(buffer)
+    audio = buffer.getvalue()
+
+    if translated:
+        _tts_memory_put(key, audio)
+        _persist_tts(key, audio)
+    return audio
+
+
 def generate_tts(text, filename=None):
     """Convert text to Hindi speech and save as an audio file
 
+    Audio is cached by source text and voice settings, so repeated texts skip
+    both translation and synthesis.
+
     Args:
         text: The text to convert to speech
-        filename: Optional filename to use; if None, generates a temporary filename
+        filename: Optional filename to write the audio to; if None, the path of
+            the cached file is returned (callers must not delete it)
 
     Returns:
         str: Path to the generated audio file
     """
     try:
-        # Create a temporary directory if filename is not provided
+        audio = synthesize_speech(text)
+
         if filename is None:
-            temp_dir = tempfile.gettempdir()
-            filename = os.path.join(temp_dir, f"speech_{uuid.uuid4()}.mp3")
+            cached_path = _tts_cache_path(_tts_cache_key(text, TTS_LANG, TTS_SLOW, TTS_TLD))
+            if os.path.exists(cached_path):
+                return cached_path
+            # Untranslated audio is not cached; hand back a one-off file instead
+            filename = os.path.join(tempfile.gettempdir(), f"speech_{uuid.uuid4()}.mp3")
 
         # Make sure the directory exists
         os.makedirs(os.path.dirname(os.path.abspath(filename)), exist_ok=True)
-
-        # Translate text to Hindi
-        try:
-            translated_text = translator.translate(text, dest="hi").text
-        except Exception as e:
-            print(f"Translation Error: {e}")
-            # If translation fails, use original text
-            translated_text = text
-
-        # Convert Hindi text to speech
-        tts = gTTS(text=translated_text, lang="hi", slow=False)
-        tts.save(filename)
+        with open(filename, "wb") as f:
+            f.write(audio)
 
         print(f"Audio file generated at: {filename}")
         return filename
@@ -412,23 +3281,173 @@ def generate_tts(text, filename=None):
         return None
 
 
-def generate_comparative_tts(analysis, filename=None):
-    """Generate Hindi TTS for the comparative analysis summary report"""
+def _comparative_tts(analysis, speak):
+    """Speak the final sentiment analysis of a comparative analysis with speak(text)"""
     try:
-        # Create a temporary directory if filename is not provided
-        if filename is None:
-            temp_dir = tempfile.gettempdir()
-            filename = os.path.join(temp_dir, f"comparative_speech_{uuid.uuid4()}.mp3")
-
-        # Make sure the directory exists
-        os.makedirs(os.path.dirname(os.path.abspath(filename)), exist_ok=True)
-
         # Get the final sentiment analysis text for TTS
         text = analysis.get("Final Sentiment Analysis", "No comparative analysis available")
         print(f"Generating speech for: {text}")
 
-        # Generate the audio file
-        return generate_tts(text, filename)
+        return speak(text)
     except Exception as e:
         print(f"Comparative TTS Error: {str(e)}")
-        return None
\ No newline at end of file
+        return None
+
+
+def generate_comparative_tts(analysis, filename=None):
+    """Generate Hindi TTS for the comparative analysis summary report"""
+    # Generate the audio file (served from the TTS cache when filename is None)
+    return _comparative_tts(analysis, lambda text: generate_tts(text, filename))
+
+
+def generate_comparative_tts_audio(analysis):
+    """Generate Hindi TTS for the comparative analysis summary report as MP3 bytes"""
+    return _comparative_tts(analysis, synthesize_speech)
+
+
+class JobQueueFull(Exception):
+    """Raised when JOB_QUEUE_LIMIT jobs are already queued or running"""
+
+
+def _get_job_executor():
+    """Return the worker pool that runs background jobs"""
+    global _job_executor
+    if _job_executor is None:
+        with _jobs_lock:
+            if _job_executor is None:
+                _job_executor = ThreadPoolExecutor(max_workers=JOB_WORKERS, thread_name_prefix="job")
+    return _job_executor
+
+
+def _job_event(job, event):
+    """Record a progress event and wake up anyone long-polling the job"""
+    with _jobs_lock:
+        job["events"].append(event)
+        _jobs_lock.notify_all()
+
+
+def _run_job(job, target):
+    """Execute a job's target on a job worker and store its outcome"""
+    with _jobs_lock:
+        job["status"] = "running"
+        job["started_at"] = time.time()
+        _jobs_lock.notify_all()
+
+    try:
+        result = target(job)
+        error = None if result is not None else "Job produced no result"
+    except Exception as e:
+        print(f"Job Error ({job['kind']}): {e}")
+        result, error = None, str(e)
+
+    with _jobs_lock:
+        job["result"] = result
+        job["error"] = error
+        job["status"] = "failed" if error else "done"
+        job["finished_at"] = time.time()
+        if _jobs_in_flight.get(job["key"]) == job["id"]:
+            del _jobs_in_flight[job["key"]]
+        _jobs_lock.notify_all()
+
+
+def _expire_jobs():
+    """Forget finished jobs older than JOB_RESULT_TTL (caller holds _jobs_lock)"""
+    cutoff = time.time() - JOB_RESULT_TTL
+    for job_id in [job_id for job_id, job in _jobs.items()
+                   if job["finished_at"] is not None and job["finished_at"] < cutoff]:
+        del _jobs[job_id]
+
+
+def submit_job(kind, key, target):
+    """Queue target(job) on the job executor and return the job id
+
+    Jobs with the same (kind, key) that are still queued or running are
+    deduplicated: the id of the existing job is returned instead. Raises
+    JobQueueFull when JOB_QUEUE_LIMIT jobs are already in flight.
+    """
+    dedupe_key = (kind, key)
+    with _jobs_lock:
+        _expire_jobs()
+        existing = _jobs_in_flight.get(dedupe_key)
+        if existing is not None:
+            _bump(_job_stats, "deduplicated")
+            return existing
+        if len(_jobs_in_flight) >= JOB_QUEUE_LIMIT:
+            _bump(_job_stats, "rejected")
+            raise JobQueueFull(f"{len(_jobs_in_flight)} jobs already queued or running")
+
+        job = {
+            "id": uuid.uuid4().hex,
+            "kind": kind,
+            "key": dedupe_key,
+            "status": "queued",
+            "events": [],
+            "result": None,
+            "error": None,
+            "created_at": time.time(),
+            "started_at": None,
+            "finished_at": None,
+        }
+        _jobs[job["id"]] = job
+        _jobs_in_flight[dedupe_key] = job["id"]
+        _bump(_job_stats, "submitted")
+
+    _get_job_executor().submit(_run_job, job, target)
+    return job["id"]
+
+
+def submit_news_job(company_name):
+    """Queue fetch_news for a company; progress events are recorded on the job"""
+    return submit_job(
+        "news", " ".join(company_name.lower().split()),
+        lambda job: fetch_news(company_name, on_event=lambda event: _job_event(job, event))
+    )
+
+
+def submit_tts_job(analysis):
+    """Queue Hindi speech synthesis of a comparative analysis; the result is MP3 bytes"""
+    text = analysis.get("Final Sentiment Analysis", "No comparative analysis available")
+    return submit_job("tts", _tts_cache_key(text, TTS_LANG, TTS_SLOW, TTS_TLD),
+                      lambda job: generate_comparative_tts_audio(analysis))
+
+
+def get_job(job_id, wait=0, since=0):
+    """Return a snapshot of a job, or None if it is unknown or expired
+
+    With wait > 0 this long-polls: it blocks for up to wait seconds until the
+    job finishes or records events beyond index since. The snapshot holds the
+    new events, the index to pass as since next time, and the result once done.
+    """
+    deadline = time.time() + max(0, wait)
+    with _jobs_lock:
+        job = _jobs.get(job_id)
+        if job is None:
+            return None
+        while job["status"] not in ("done", "failed") and len(job["events"]) <= since:
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                break
+            _jobs_lock.wait(remaining)
+
+        return {
+            "id": job["id"],
+            "kind": job["kind"],
+            "status": job["status"],
+            "events": job["events"][since:],
+            "next": len(job["events"]),
+            "result": job["result"],
+            "error": job["error"],
+        }
+
+
+def get_job_stats():
+    """Return job queue counters and current queue depth"""
+    with _stats_lock:
+        stats = dict(_job_stats)
+    with _jobs_lock:
+        stats["in_flight"] = len(_jobs_in_flight)
+        stats["retained"] = len(_jobs)
+    return stats
+
+
+_startup_timings["utils_import"] = time.perf_counter() - _IMPORT_STARTED